@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from rest_framework.authentication import TokenAuthentication
+
+
+class TokenCache:
+    """Кэш соответствия токена пользователю в памяти процесса.
+
+    Записи живут не дольше ``ttl`` секунд, при превышении ``max_size``
+    вытесняются самые давно использованные.
+    """
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.ttl <= 0 or self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            keys = [
+                key for key, (_, (cached_user_id, *_)) in self._entries.items()
+                if cached_user_id == user_id
+            ]
+            for key in keys:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+token_cache = TokenCache(
+    ttl=settings.TOKEN_CACHE_TTL,
+    max_size=settings.TOKEN_CACHE_MAX_SIZE
+)
+
+
+def get_field_values(instance):
+    """Значения полей записи, не связанные с самим экземпляром."""
+    return tuple(
+        field.get_prep_value(field.value_from_object(instance))
+        for field in instance._meta.concrete_fields
+    )
+
+
+def restore_instance(model, db, values):
+    return model.from_db(
+        db,
+        [field.attname for field in model._meta.concrete_fields],
+        values
+    )
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Аутентификация по токену с кэшированием пользователя.
+
+    В кэше хранятся значения полей, и каждый запрос получает свои
+    экземпляры пользователя и токена. Отозванный в другом процессе
+    токен перестает действовать не позже чем через ``TOKEN_CACHE_TTL``
+    секунд.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, (
+                user.pk,
+                user._state.db,
+                get_field_values(user),
+                get_field_values(token)
+            ))
+            return user, token
+        _, db, user_values, token_values = cached
+        user = restore_instance(get_user_model(), db, user_values)
+        token = restore_instance(self.get_model(), db, token_values)
+        token.user = user
+        return user, token
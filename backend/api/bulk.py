@@ -0,0 +1,80 @@
+from django.db import transaction
+
+from recipes.changes import USER_ITEM_ENTITIES, record_changes
+
+
+BULK_ADDED = 'added'
+BULK_EXISTS = 'exists'
+BULK_REMOVED = 'removed'
+BULK_ABSENT = 'absent'
+BULK_NOT_FOUND = 'not_found'
+BULK_FORBIDDEN = 'forbidden'
+
+
+def apply_bulk_changes(user, model, target_model, target_field,
+                       add_ids, remove_ids, forbidden_ids=()):
+    """Массовое добавление и удаление связей пользователя с объектами.
+
+    Выполняется в одной транзакции за фиксированное число запросов,
+    независимо от длины списков. Возвращает итог для каждого id.
+    """
+    requested_ids = set(add_ids) | set(remove_ids)
+    outcomes = {}
+
+    with transaction.atomic():
+        existing_ids = set(
+            target_model.objects.filter(
+                id__in=requested_ids
+            ).values_list('id', flat=True)
+        )
+        related_ids = set(
+            model.objects.filter(
+                user=user, **{f'{target_field}__in': existing_ids}
+            ).values_list(f'{target_field}_id', flat=True)
+        )
+
+        to_create = []
+        for obj_id in add_ids:
+            if obj_id not in existing_ids:
+                outcomes[obj_id] = BULK_NOT_FOUND
+            elif obj_id in forbidden_ids:
+                outcomes[obj_id] = BULK_FORBIDDEN
+            elif obj_id in related_ids:
+                outcomes[obj_id] = BULK_EXISTS
+            else:
+                outcomes[obj_id] = BULK_ADDED
+                to_create.append(
+                    model(user=user, **{f'{target_field}_id': obj_id})
+                )
+        if to_create:
+            model.objects.bulk_create(to_create, ignore_conflicts=True)
+            if model in USER_ITEM_ENTITIES:
+                record_changes(
+                    USER_ITEM_ENTITIES[model],
+                    [getattr(obj, f'{target_field}_id') for obj in to_create],
+                    user.id
+                )
+
+        to_delete = []
+        for obj_id in remove_ids:
+            if obj_id not in existing_ids:
+                outcomes[obj_id] = BULK_NOT_FOUND
+            elif obj_id in related_ids:
+                outcomes[obj_id] = BULK_REMOVED
+                to_delete.append(obj_id)
+            else:
+                outcomes[obj_id] = BULK_ABSENT
+        if to_delete:
+            model.objects.filter(
+                user=user, **{f'{target_field}_id__in': to_delete}
+            ).delete()
+            if model in USER_ITEM_ENTITIES:
+                record_changes(
+                    USER_ITEM_ENTITIES[model], to_delete, user.id,
+                    deleted=True
+                )
+
+    return [
+        {'id': obj_id, 'status': outcomes[obj_id]}
+        for obj_id in list(add_ids) + list(remove_ids)
+    ]
@@ -0,0 +1,17 @@
+import hashlib
+
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_cache_shared(alias='default'):
+    """Кэш общий для рабочих процессов, а не в памяти каждого из них."""
+    return not isinstance(caches[alias], (LocMemCache, DummyCache))
+
+
+def hash_key(*parts):
+    """Часть ключа кэша фиксированной длины: memcached не принимает
+    ключи длиннее 250 символов и с пробелами.
+    """
+    return hashlib.md5('\n'.join(map(str, parts)).encode()).hexdigest()
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.checks import Error, register
+
+from api.caching import is_cache_shared
+
+
+@register()
+def check_shared_cache(app_configs, **kwargs):
+    """Настройки, которые работают только с общим для процессов кэшем."""
+    if settings.REQUEST_COALESCING_SHARED and not is_cache_shared():
+        return [Error(
+            'REQUEST_COALESCING_SHARED требует кэша, общего для процессов.',
+            hint='Задайте CACHE_LOCATION или отключите '
+                 'REQUEST_COALESCING_SHARED.',
+            id='api.E001',
+        )]
+    return []
@@ -0,0 +1,101 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from api.metrics import metrics
+
+
+LOCK_CACHE_KEY = 'coalescing:lock:{}'
+RESULT_CACHE_KEY = 'coalescing:result:{}'
+POLL_INTERVAL = 0.05
+
+
+class _Call:
+    """Вычисление, которого ждут одновременные запросы."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Одно вычисление на ключ для одновременных запросов процесса.
+
+    Первый запрос с ключом выполняет вычисление, остальные ждут
+    его и получают тот же результат или то же исключение.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, compute):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.increment('coalescing.local')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = compute()
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+single_flight = SingleFlight()
+
+
+def _compute_shared(key, compute):
+    """Одно вычисление на ключ для всех процессов.
+
+    Процесс, взявший блокировку в кэше, кладет результат
+    под ключом на REQUEST_COALESCING_RESULT_TIMEOUT секунд,
+    остальные ждут его не дольше REQUEST_COALESCING_WAIT секунд
+    и после этого считают сами.
+    """
+    lock_key = LOCK_CACHE_KEY.format(key)
+    result_key = RESULT_CACHE_KEY.format(key)
+    deadline = time.monotonic() + settings.REQUEST_COALESCING_WAIT
+    while True:
+        result = cache.get(result_key)
+        if result is not None:
+            metrics.increment('coalescing.shared')
+            return result
+        if cache.add(lock_key, 1, settings.REQUEST_COALESCING_WAIT):
+            break
+        if time.monotonic() >= deadline:
+            metrics.increment('coalescing.timeout')
+            return compute()
+        time.sleep(POLL_INTERVAL)
+
+    try:
+        result = compute()
+        cache.set(
+            result_key, result, settings.REQUEST_COALESCING_RESULT_TIMEOUT
+        )
+        return result
+    finally:
+        cache.delete(lock_key)
+
+
+def coalesce(key, compute):
+    """Результат compute, общий для одновременных запросов с ключом."""
+    if not settings.REQUEST_COALESCING_SHARED:
+        return single_flight.do(key, compute)
+    return single_flight.do(key, lambda: _compute_shared(key, compute))
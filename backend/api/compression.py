@@ -0,0 +1,150 @@
+import gzip
+import zlib
+
+import brotli
+from django.utils.cache import patch_vary_headers
+
+from api.constants import (COMPRESSION_BROTLI_QUALITY,
+                           COMPRESSION_CONTENT_TYPE, COMPRESSION_GZIP_LEVEL,
+                           COMPRESSION_MIN_SIZE, COMPRESSION_PATH_PREFIX,
+                           COMPRESSION_STREAM_FLUSH_SIZE)
+
+
+BROTLI = 'br'
+GZIP = 'gzip'
+# Кодировки в порядке предпочтения при равном q.
+ENCODINGS = (BROTLI, GZIP)
+
+
+def get_accepted_encoding(request):
+    """Лучшая из поддерживаемых кодировок по Accept-Encoding."""
+    weights = {}
+    for item in request.META.get('HTTP_ACCEPT_ENCODING', '').split(','):
+        coding, *params = item.strip().lower().split(';')
+        weight = 1.0
+        for param in params:
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.strip()] = weight
+    default = weights.get('*', 0.0)
+    accepted = [
+        encoding for encoding in ENCODINGS
+        if weights.get(encoding, default) > 0
+    ]
+    if not accepted:
+        return None
+    return max(accepted, key=lambda encoding: weights.get(encoding, default))
+
+
+def compress(data, encoding):
+    """Сжатое тело или None, если оно мало или сжатие не помогает."""
+    if len(data) < COMPRESSION_MIN_SIZE:
+        return None
+    if encoding == BROTLI:
+        compressed = brotli.compress(
+            data, quality=COMPRESSION_BROTLI_QUALITY
+        )
+    else:
+        compressed = gzip.compress(
+            data, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0
+        )
+    return compressed if len(compressed) < len(data) else None
+
+
+def iter_compressed(chunks, encoding):
+    """Сжатие потока без накопления всего ответа.
+
+    Сжатые данные сбрасываются клиенту не реже, чем через
+    COMPRESSION_STREAM_FLUSH_SIZE байт исходного потока.
+    """
+    if encoding == BROTLI:
+        compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+        process, flush, finish = (
+            compressor.process, compressor.flush, compressor.finish
+        )
+    else:
+        compressor = zlib.compressobj(
+            COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+        )
+        process, finish = compressor.compress, compressor.flush
+
+        def flush():
+            return compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    pending = 0
+    for chunk in chunks:
+        data = process(chunk)
+        pending += len(chunk)
+        if pending >= COMPRESSION_STREAM_FLUSH_SIZE:
+            data += flush()
+            pending = 0
+        if data:
+            yield data
+    yield finish()
+
+
+def is_compressible(request, response):
+    """Сжимается только JSON API. Страницы админки и прочий HTML
+    с CSRF-токеном рядом с отраженным вводом пользователя при сжатии
+    уязвимы для BREACH.
+    """
+    return (
+        request.path.startswith(COMPRESSION_PATH_PREFIX)
+        and response.get('Content-Type', '').startswith(
+            COMPRESSION_CONTENT_TYPE
+        )
+    )
+
+
+def set_encoding(response, encoding):
+    """Заголовки сжатого ответа. Сжатое и исходное тело
+    равнозначны, поэтому сильный ETag становится слабым.
+    """
+    response['Content-Encoding'] = encoding
+    etag = response.get('ETag')
+    if etag and etag.startswith('"'):
+        response['ETag'] = 'W/' + etag
+    return response
+
+
+class CompressionMiddleware:
+    """Сжатие gzip или brotli ответов API в формате JSON.
+
+    Обычные ответы сжимаются от COMPRESSION_MIN_SIZE байт, потоковые -
+    по мере отдачи. Ответы, уже сжатые во вьюсете (например, страницы
+    списка из кэша), пропускаются.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            not is_compressible(request, response)
+            or response.has_header('Content-Encoding')
+        ):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = get_accepted_encoding(request)
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = iter_compressed(
+                response.streaming_content, encoding
+            )
+            if response.has_header('Content-Length'):
+                del response['Content-Length']
+            return set_encoding(response, encoding)
+
+        compressed = compress(response.content, encoding)
+        if compressed is None:
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        return set_encoding(response, encoding)
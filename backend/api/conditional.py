@@ -0,0 +1,64 @@
+import hashlib
+import json
+
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags
+
+
+def get_version(data):
+    """Хэш общей части ответа."""
+    return hashlib.md5(
+        json.dumps(data, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def get_flags(recipe_id, author_id, membership):
+    """Флаги пользователя для рецепта одной строкой."""
+    if membership is None:
+        return '000'
+    return ''.join(
+        '1' if flag else '0' for flag in (
+            recipe_id in membership.favorites,
+            recipe_id in membership.shopping_cart,
+            author_id in membership.subscriptions,
+        )
+    )
+
+
+def get_recipe_etag(recipe_id, author_id, updated_at, membership):
+    return 'W/"{}-{}-{}"'.format(
+        recipe_id,
+        int(updated_at.timestamp() * 10 ** 6),
+        get_flags(recipe_id, author_id, membership)
+    )
+
+
+def get_list_etag(version, recipes, membership):
+    flags = ''.join(
+        get_flags(recipe['id'], recipe['author']['id'], membership)
+        for recipe in recipes
+    )
+    return 'W/"{}-{}"'.format(
+        version, hashlib.md5(flags.encode()).hexdigest()[:16]
+    )
+
+
+def _strip_weak(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def etag_matches(request, etag):
+    """Слабое сравнение ETag с заголовком If-None-Match."""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    return '*' in etags or _strip_weak(etag) in map(_strip_weak, etags)
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_vary_headers(response, ('Authorization',))
+    return response
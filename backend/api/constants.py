@@ -2,3 +2,23 @@ MAX_LENGTH_SHORT_URL = 6
 REQUIRED_FIELDS_FOR_UPDATE = (
     'name', 'text', 'cooking_time', 'tags', 'ingredients'
 )
+MAX_BULK_SIZE = 100
+MAX_PAGE_SIZE = 100
+ORDERING_TRENDING = 'trending'
+FACETS_IGNORED_PARAMS = ('tags', 'tags_match', 'ordering', 'page', 'limit')
+FACETS_CACHE_TIMEOUT = 60
+TAGS_MATCH_ANY = 'any'
+TAGS_MATCH_ALL = 'all'
+RECIPE_LIST_CACHE_TIMEOUT = 60
+STREAM_CHUNK_SIZE = 100
+MAX_STREAM_SIZE = 10000
+MEDIA_GC_BATCH_SIZE = 1000
+MEDIA_IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+MEDIA_CACHE_CONTROL = 'public, max-age=3600'
+COMPRESSION_MIN_SIZE = 1024
+COMPRESSION_STREAM_FLUSH_SIZE = 64 * 1024
+COMPRESSION_GZIP_LEVEL = 6
+COMPRESSION_BROTLI_QUALITY = 5
+COMPRESSION_CONTENT_TYPE = 'application/json'
+COMPRESSION_PATH_PREFIX = '/api/'
+IDEMPOTENCY_RETRY_AFTER = 1
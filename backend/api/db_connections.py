@@ -0,0 +1,49 @@
+import threading
+import weakref
+
+from django.conf import settings
+from django.db import connections
+
+from api.metrics import metrics
+
+
+_open_connections = weakref.WeakSet()
+_lock = threading.Lock()
+
+
+def track_opened_connection(connection):
+    with _lock:
+        _open_connections.add(connection)
+        open_count = sum(
+            1 for conn in _open_connections if conn.connection is not None
+        )
+    metrics.increment('db.connections.opened')
+    metrics.set('db.connections.open', open_count)
+
+
+def check_reused_connections():
+    """Проверка открытых соединений перед повторным использованием."""
+    for conn in connections.all():
+        if conn.connection is None:
+            continue
+        if settings.DB_CONN_HEALTH_CHECKS and not conn.is_usable():
+            conn.close()
+            metrics.increment('db.connections.failed')
+        else:
+            metrics.increment('db.connections.reused')
+
+
+def release_excess_connections():
+    """Закрытие соединений потока сверх лимита на воркер."""
+    limit = settings.DB_MAX_CONNECTIONS_PER_WORKER
+    with _lock:
+        open_count = sum(
+            1 for conn in _open_connections if conn.connection is not None
+        )
+    if limit and open_count > limit:
+        for conn in connections.all():
+            if conn.connection is not None:
+                conn.close()
+                metrics.increment('db.connections.released')
+                open_count -= 1
+    metrics.set('db.connections.open', open_count)
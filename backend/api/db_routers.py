@@ -0,0 +1,72 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+PRIMARY_DATABASE = 'default'
+STICKY_CACHE_KEY = 'db_primary_pin:{}'
+STICKY_COOKIE = 'db_primary_pin'
+STICKY_COOKIE_SALT = 'api.db_routers.primary_pin'
+
+replica_reads = ContextVar('replica_reads', default=False)
+
+
+def pin_to_primary(request, response):
+    """Закрепление чтений пользователя за основной базой после записи.
+
+    Отметка уходит клиенту в подписанной cookie со временем подписи,
+    поэтому ее видит любой процесс. Для клиентов без cookie она
+    также хранится в кэше: между процессами - только в общем кэше.
+    """
+    user = request.user
+    if not user.is_authenticated or settings.REPLICA_STICKY_SECONDS <= 0:
+        return
+    response.set_signed_cookie(
+        STICKY_COOKIE,
+        str(user.pk),
+        salt=STICKY_COOKIE_SALT,
+        max_age=settings.REPLICA_STICKY_SECONDS,
+        httponly=True,
+        samesite='Lax'
+    )
+    cache.set(
+        STICKY_CACHE_KEY.format(user.pk),
+        True,
+        settings.REPLICA_STICKY_SECONDS
+    )
+
+
+def is_pinned_to_primary(request):
+    user = request.user
+    if not user.is_authenticated:
+        return False
+    pinned_user = request.get_signed_cookie(
+        STICKY_COOKIE,
+        default=None,
+        salt=STICKY_COOKIE_SALT,
+        max_age=settings.REPLICA_STICKY_SECONDS
+    )
+    return pinned_user == str(user.pk) or cache.get(
+        STICKY_CACHE_KEY.format(user.pk), False
+    )
+
+
+class PrimaryReplicaRouter:
+    """Роутер, направляющий разрешенные чтения на реплики."""
+
+    def db_for_read(self, model, **hints):
+        replicas = settings.DATABASE_REPLICAS
+        if replicas and replica_reads.get():
+            return random.choice(replicas)
+        return PRIMARY_DATABASE
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_DATABASE
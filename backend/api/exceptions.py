@@ -0,0 +1,50 @@
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class ServiceOverloaded(APIException):
+    """Слишком много одновременных тяжелых запросов."""
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Сервис перегружен, повторите запрос позже.'
+    default_code = 'service_overloaded'
+
+    def __init__(self, wait, detail=None, code=None):
+        super().__init__(detail, code)
+        self.wait = wait
+
+
+class QueryDeadlineExceeded(APIException):
+    """Запросы к базе данных не уложились в отведенное время."""
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Превышено время выполнения запроса.'
+    default_code = 'query_deadline_exceeded'
+
+
+class ChangesCursorExpired(APIException):
+    """Курсор синхронизации старше сжатой части журнала изменений."""
+
+    status_code = status.HTTP_410_GONE
+    default_detail = 'Курсор устарел, нужна полная синхронизация.'
+    default_code = 'changes_cursor_expired'
+
+
+class IdempotencyKeyInUse(APIException):
+    """Запрос с тем же Idempotency-Key еще выполняется."""
+
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Запрос с этим ключом еще выполняется.'
+    default_code = 'idempotency_key_in_use'
+
+    def __init__(self, wait, detail=None, code=None):
+        super().__init__(detail, code)
+        self.wait = wait
+
+
+class IdempotencyKeyMismatch(APIException):
+    """Idempotency-Key уже использован для другого запроса."""
+
+    status_code = status.HTTP_422_UNPROCESSABLE_ENTITY
+    default_detail = 'Ключ уже использован для другого запроса.'
+    default_code = 'idempotency_key_mismatch'
@@ -1,6 +1,10 @@
+from django.db.models import Count, Exists, OuterRef, Q
 from django_filters import rest_framework as filters
+from rest_framework.exceptions import ValidationError
 
-from recipes.models import Ingredient, Recipe, Tag
+from api.constants import (FACETS_IGNORED_PARAMS, ORDERING_TRENDING,
+                           TAGS_MATCH_ALL, TAGS_MATCH_ANY)
+from recipes.models import Ingredient, Recipe, RecipeTag, Tag
 
 
 class IngredientFilter(filters.FilterSet):
@@ -25,12 +29,50 @@ class RecipesFilter(filters.FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
-        queryset=Tag.objects.all()
+        queryset=Tag.objects.all(),
+        method='filter_tags'
+    )
+    tags_match = filters.ChoiceFilter(
+        choices=(
+            (TAGS_MATCH_ANY, TAGS_MATCH_ANY),
+            (TAGS_MATCH_ALL, TAGS_MATCH_ALL),
+        ),
+        method='skip_filter'
+    )
+    ordering = filters.ChoiceFilter(
+        choices=((ORDERING_TRENDING, ORDERING_TRENDING),),
+        method='order_by_popularity'
     )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'author', 'tags', 'tags_match', 'is_favorited',
+            'is_in_shopping_cart', 'ordering'
+        )
+
+    def skip_filter(self, queryset, name, value):
+        return queryset
+
+    def filter_tags(self, queryset, name, value):
+        """Фильтрация по тегам через EXISTS без размножения строк.
+
+        По умолчанию нужен хотя бы один из тегов, с tags_match=all - все.
+        """
+        if not value:
+            return queryset
+
+        recipe_tags = RecipeTag.objects.filter(recipe=OuterRef('pk'))
+        if self.form.cleaned_data.get('tags_match') == TAGS_MATCH_ALL:
+            for tag in value:
+                queryset = queryset.filter(
+                    Exists(recipe_tags.filter(tag=tag))
+                )
+            return queryset
+        return queryset.filter(Exists(recipe_tags.filter(tag__in=value)))
+
+    def order_by_popularity(self, queryset, name, value):
+        return queryset.order_by('-trending_score', '-pub_date')
 
     def filter_by_user_relation(self, queryset, name, value):
         user = self.request.user
@@ -48,3 +90,27 @@ class RecipesFilter(filters.FilterSet):
         if value and user.is_authenticated:
             return queryset.filter(**{related_field: user})
         return queryset
+
+
+def count_tag_facets(data, request):
+    """Число рецептов по каждому тегу с учетом остальных фильтров.
+
+    Выбранные теги не учитываются, чтобы были видны счетчики
+    и для невыбранных тегов. Считается одним запросом.
+    """
+    data = data.copy()
+    for param in FACETS_IGNORED_PARAMS:
+        data.pop(param, None)
+
+    filterset = RecipesFilter(
+        data, queryset=Recipe.objects.all(), request=request
+    )
+    if not filterset.is_valid():
+        raise ValidationError(filterset.errors)
+
+    return Tag.objects.annotate(
+        recipes_count=Count(
+            'recipes',
+            filter=Q(recipes__in=filterset.qs.values('id'))
+        )
+    )
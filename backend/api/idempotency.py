@@ -0,0 +1,127 @@
+import hashlib
+import json
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from api.constants import IDEMPOTENCY_RETRY_AFTER
+from api.exceptions import IdempotencyKeyInUse, IdempotencyKeyMismatch
+from recipes.constants import MAX_LENGTH_IDEMPOTENCY_KEY
+from recipes.models import IdempotencyKey
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+CLAIM_ATTEMPTS = 3
+
+
+def get_fingerprint(request):
+    """Хэш метода, пути и данных запроса."""
+    return hashlib.sha256(json.dumps(
+        [request.method, request.path, request.data],
+        sort_keys=True,
+        default=str
+    ).encode()).hexdigest()
+
+
+def is_expired(record):
+    """Ответ хранится дольше IDEMPOTENCY_KEY_TTL или запрос
+    не завершился за IDEMPOTENCY_LOCK_TIMEOUT секунд.
+    """
+    timeout = (
+        settings.IDEMPOTENCY_LOCK_TIMEOUT if record.status_code is None
+        else settings.IDEMPOTENCY_KEY_TTL
+    )
+    return record.created < timezone.now() - timedelta(seconds=timeout)
+
+
+def claim_key(user, key, fingerprint):
+    """Запись ключа для нового запроса или прежняя запись.
+
+    Одновременные запросы с одним ключом разделяет уникальное
+    ограничение (user, key): запись создает только один из них.
+    Устаревшая запись удаляется и ключ занимается заново.
+    """
+    for _ in range(CLAIM_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user=user, key=key, fingerprint=fingerprint
+                ), True
+        except IntegrityError:
+            record = IdempotencyKey.objects.filter(
+                user=user, key=key
+            ).first()
+        if record is None:
+            continue
+        if not is_expired(record):
+            return record, False
+        IdempotencyKey.objects.filter(
+            id=record.id, created=record.created
+        ).delete()
+    raise IdempotencyKeyInUse(wait=IDEMPOTENCY_RETRY_AFTER)
+
+
+def replay(record, fingerprint):
+    if record.fingerprint != fingerprint:
+        raise IdempotencyKeyMismatch()
+    if record.status_code is None:
+        raise IdempotencyKeyInUse(wait=IDEMPOTENCY_RETRY_AFTER)
+    response = Response(record.response, status=record.status_code)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(method):
+    """Декоратор действия вьюсета для запросов с Idempotency-Key.
+
+    Ответ на первый запрос с ключом хранится IDEMPOTENCY_KEY_TTL
+    секунд, повторы получают его без повторного выполнения.
+    Повтор, пока первый запрос выполняется, получает 409, повтор
+    с тем же ключом и другими данными - 422. После исключения
+    или ответа 5xx ключ освобождается и запрос можно повторить.
+    """
+
+    @wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key or not request.user.is_authenticated:
+            return method(view, request, *args, **kwargs)
+        if len(key) > MAX_LENGTH_IDEMPOTENCY_KEY:
+            raise ValidationError({IDEMPOTENCY_HEADER: (
+                f'Не более {MAX_LENGTH_IDEMPOTENCY_KEY} символов.'
+            )})
+
+        fingerprint = get_fingerprint(request)
+        record, created = claim_key(request.user, key, fingerprint)
+        if not created:
+            return replay(record, fingerprint)
+        try:
+            response = method(view, request, *args, **kwargs)
+        except Exception:
+            record.delete()
+            raise
+        if status.is_server_error(response.status_code):
+            record.delete()
+            return response
+        record.status_code = response.status_code
+        record.response = response.data
+        record.save(update_fields=('status_code', 'response'))
+        return response
+
+    return wrapper
+
+
+def clear_idempotency_keys():
+    """Удаление ответов старше IDEMPOTENCY_KEY_TTL."""
+    cutoff = timezone.now() - timedelta(
+        seconds=settings.IDEMPOTENCY_KEY_TTL
+    )
+    deleted, _ = IdempotencyKey.objects.filter(created__lt=cutoff).delete()
+    return deleted
@@ -0,0 +1,137 @@
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from api.exceptions import QueryDeadlineExceeded, ServiceOverloaded
+from api.metrics import metrics
+
+
+CONCURRENCY_CACHE_KEY = 'concurrency:{}'
+CONCURRENCY_KEY_TIMEOUT = 300
+POSTGRES_QUERY_CANCELED = '57014'
+
+
+def is_statement_timeout(exc):
+    return getattr(exc.__cause__, 'pgcode', None) == POSTGRES_QUERY_CANCELED
+
+
+@contextmanager
+def concurrency_slot(route):
+    """Ограничение числа одновременных запросов к маршруту.
+
+    Счетчик хранится в кэше Django и общий для воркеров, только
+    если кэш общий (CACHE_LOCATION), иначе лимит действует в каждом
+    процессе отдельно. Превышение лимита - ответ 503 с Retry-After.
+    """
+    limit = settings.CONCURRENCY_LIMITS.get(route)
+    if not limit:
+        yield
+        return
+
+    key = CONCURRENCY_CACHE_KEY.format(route)
+    cache.add(key, 0, CONCURRENCY_KEY_TIMEOUT)
+    try:
+        running = cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, CONCURRENCY_KEY_TIMEOUT)
+        running = 1
+
+    try:
+        if running > limit:
+            metrics.increment(f'concurrency.rejected.{route}')
+            raise ServiceOverloaded(wait=settings.CONCURRENCY_RETRY_AFTER)
+        yield
+    finally:
+        try:
+            cache.decr(key)
+        except ValueError:
+            pass
+
+
+class QueryDeadline:
+    """Ограничение времени на запросы к базе в рамках одного запроса.
+
+    Срок проверяется перед каждым запросом. В PostgreSQL без внешнего
+    пулера дополнительно выставляется statement_timeout на оставшееся
+    время: с пулером в режиме transaction настройка сессии попала бы
+    в чужое серверное соединение.
+    """
+
+    def __init__(self, timeout_ms):
+        self.deadline = time.monotonic() + timeout_ms / 1000
+        self.timeouts_set = set()
+
+    def remaining_ms(self):
+        remaining = int((self.deadline - time.monotonic()) * 1000)
+        if remaining <= 0:
+            metrics.increment('query_deadline.exceeded')
+            raise QueryDeadlineExceeded()
+        return remaining
+
+    def __call__(self, execute, sql, params, many, context):
+        remaining = self.remaining_ms()
+        connection = context['connection']
+        if (
+            connection.vendor == 'postgresql'
+            and not settings.DB_EXTERNAL_POOLER
+            and connection.alias not in self.timeouts_set
+        ):
+            self.timeouts_set.add(connection.alias)
+            with connection.cursor() as cursor:
+                cursor.execute(f'SET statement_timeout = {remaining}')
+        return execute(sql, params, many, context)
+
+    def reset(self):
+        for alias in self.timeouts_set:
+            connection = connections[alias]
+            if connection.connection is None:
+                continue
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute('RESET statement_timeout')
+            except Exception:
+                connection.close()
+
+
+class HeldLimits:
+    """Итератор потокового ответа, который держит лимиты запроса
+    до конца отдачи: тело генерируется уже после выхода из вьюсета.
+    """
+
+    def __init__(self, iterable, stack):
+        self.iterator = iter(iterable)
+        self.stack = stack
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self.iterator)
+        except BaseException:
+            self.close()
+            raise
+
+    def close(self):
+        self.stack.close()
+
+
+@contextmanager
+def query_deadline(route):
+    timeout_ms = settings.QUERY_TIMEOUTS.get(route)
+    if not timeout_ms:
+        yield
+        return
+
+    deadline = QueryDeadline(timeout_ms)
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(deadline))
+        try:
+            yield
+        finally:
+            stack.close()
+            deadline.reset()
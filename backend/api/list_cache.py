@@ -0,0 +1,155 @@
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.caching import hash_key, is_cache_shared
+from api.compression import compress
+from api.conditional import get_version
+from api.constants import RECIPE_LIST_CACHE_TIMEOUT
+from api.membership import get_request_membership
+from api.metrics import metrics
+from recipes.changes import record_changes
+from recipes.models import Change, Recipe
+
+
+GENERATION_CACHE_KEY = 'recipes:list:generation'
+LIST_CACHE_KEY = 'recipes:list:{}:{}'
+DETAIL_CACHE_KEY = 'recipes:detail:{}:{}:{}'
+# Фильтры, результат которых зависит от текущего пользователя.
+VIEWER_FILTERS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def is_list_cacheable(request):
+    """Общая часть списка одинакова для всех, если в запросе нет
+    фильтров по избранному и покупкам текущего пользователя.
+
+    Страницы кэшируются только в общем кэше: поколение в кэше
+    процесса не меняется при записи в других процессах.
+    """
+    return is_cache_shared() and not (
+        request.user.is_authenticated
+        and any(request.query_params.get(name) for name in VIEWER_FILTERS)
+    )
+
+
+def get_list_cache_key(request):
+    generation = cache.get(GENERATION_CACHE_KEY, 0)
+    params = urlencode(sorted(request.query_params.lists()), doseq=True)
+    return LIST_CACHE_KEY.format(
+        generation, hash_key(request.get_host(), params)
+    )
+
+
+def get_detail_cache_key(request, pk):
+    generation = cache.get(GENERATION_CACHE_KEY, 0)
+    return DETAIL_CACHE_KEY.format(generation, request.get_host(), pk)
+
+
+def get_cached_list(key):
+    data = cache.get(key)
+    metrics.increment(
+        'recipe_list_cache.miss' if data is None else 'recipe_list_cache.hit'
+    )
+    return data
+
+
+def share_recipe(recipe):
+    """Рецепт без флагов текущего пользователя."""
+    return dict(
+        recipe,
+        is_favorited=False,
+        is_in_shopping_cart=False,
+        author=dict(recipe['author'], is_subscribed=False)
+    )
+
+
+def personalize_recipe(recipe, membership):
+    """Флаги пользователя поверх общей части рецепта."""
+    return dict(
+        recipe,
+        is_favorited=recipe['id'] in membership.favorites,
+        is_in_shopping_cart=recipe['id'] in membership.shopping_cart,
+        author=dict(
+            recipe['author'],
+            is_subscribed=recipe['author']['id'] in membership.subscriptions
+        )
+    )
+
+
+def cache_list(key, data):
+    """Сохранение страницы без флагов текущего пользователя
+    вместе с ее версией и временем изменения рецептов.
+    """
+    data = dict(data)
+    data['results'] = [share_recipe(recipe) for recipe in data['results']]
+    page = {
+        'data': data,
+        'version': get_version(data),
+        'last_modified': Recipe.objects.filter(
+            id__in=[recipe['id'] for recipe in data['results']]
+        ).aggregate(last_modified=Max('updated_at'))['last_modified'],
+    }
+    cache.set(key, page, RECIPE_LIST_CACHE_TIMEOUT)
+    return page
+
+
+def get_compressed_list(key, page, encoding):
+    """Сжатое тело общей части страницы.
+
+    Тело сжимается при первом запросе с этой кодировкой и хранится
+    в кэше вместе со страницей, последующие запросы его не сжимают.
+    None, если страница слишком мала для сжатия.
+    """
+    compressed = page.setdefault('compressed', {})
+    if encoding not in compressed:
+        compressed[encoding] = compress(
+            JSONRenderer().render(page['data']), encoding
+        )
+        cache.set(key, page, RECIPE_LIST_CACHE_TIMEOUT)
+    return compressed[encoding]
+
+
+def personalize_list(data, request):
+    """Флаги текущего пользователя поверх общей части страницы."""
+    membership = get_request_membership(request)
+    if membership is None:
+        return data
+    data = dict(data)
+    data['results'] = [
+        personalize_recipe(recipe, membership) for recipe in data['results']
+    ]
+    return data
+
+
+def personalize_detail(recipe, request):
+    membership = get_request_membership(request)
+    if membership is None:
+        return recipe
+    return personalize_recipe(recipe, membership)
+
+
+def touch_recipes(recipes):
+    """Отметка об изменении рецептов, представление которых
+    изменилось без сохранения самих рецептов, и запись их
+    в журнал изменений для синхронизации клиентов.
+    """
+    with transaction.atomic():
+        recipe_ids = list(recipes.values_list('id', flat=True).distinct())
+        Recipe.objects.filter(id__in=recipe_ids).update(
+            updated_at=timezone.now()
+        )
+        record_changes(Change.RECIPE, recipe_ids)
+    invalidate_recipe_lists()
+
+
+def invalidate_recipe_lists():
+    """Смена поколения после изменения рецептов или их авторов."""
+    cache.add(GENERATION_CACHE_KEY, 0, None)
+    try:
+        cache.incr(GENERATION_CACHE_KEY)
+    except ValueError:
+        cache.set(GENERATION_CACHE_KEY, 1, None)
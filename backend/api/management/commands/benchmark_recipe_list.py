@@ -0,0 +1,60 @@
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from api.serializers import RecipeReadSerializer
+from api.streaming import iter_chunks, iter_json_list
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    """Команда для сравнения пиковой памяти обычной и потоковой
+    выдачи списка рецептов на данных из базы.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limits', type=int, nargs='+', default=[100, 500, 2000]
+        )
+
+    def measure(self, render):
+        tracemalloc.start()
+        started = time.perf_counter()
+        size = render()
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return size, elapsed, peak
+
+    def handle(self, *args, **options):
+        context = {
+            'request': Request(APIRequestFactory().get('/api/recipes/'))
+        }
+        queryset = Recipe.objects.select_related('author').prefetch_related(
+            'tags', 'ingredients'
+        )
+
+        def render_page(limit):
+            data = RecipeReadSerializer(
+                queryset[:limit], many=True, context=context
+            ).data
+            return len(JSONRenderer().render(data))
+
+        def render_stream(limit):
+            return sum(map(len, iter_json_list(
+                iter_chunks(queryset, limit), RecipeReadSerializer, context
+            )))
+
+        for limit in options['limits']:
+            for name, render in (('page', render_page),
+                                 ('stream', render_stream)):
+                size, elapsed, peak = self.measure(lambda: render(limit))
+                self.stdout.write(
+                    f'{name:>6} limit={limit}: {size / 2 ** 20:.1f} MiB '
+                    f'of JSON in {elapsed:.2f}s, '
+                    f'peak {peak / 2 ** 20:.1f} MiB'
+                )
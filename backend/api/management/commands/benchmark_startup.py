@@ -0,0 +1,69 @@
+import json
+import os
+import subprocess
+import sys
+from statistics import median
+
+from django.core.management.base import BaseCommand
+
+
+# Код рабочего процесса: запуск Django, прогрев по желанию
+# и первые запросы, время этапов выводится в JSON.
+WORKER_CODE = '''
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+timings = {"setup": time.perf_counter() - started}
+if sys.argv[1] == "warm":
+    from backend.warmup import warm_up
+    started = time.perf_counter()
+    warm_up()
+    timings["warm_up"] = time.perf_counter() - started
+from django.test import Client
+client = Client()
+for path in sys.argv[2:]:
+    started = time.perf_counter()
+    client.get(path)
+    timings[path] = time.perf_counter() - started
+print(json.dumps(timings))
+'''
+
+
+class Command(BaseCommand):
+    """Команда для замера времени запуска рабочего процесса
+    и первых запросов без прогрева и после него.
+
+    С preload_app запуск и прогрев оплачивает мастер один раз,
+    рабочему процессу остаются только первые запросы.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument(
+            '--paths', nargs='+',
+            default=['/api/recipes/', '/api/tags/', '/api/ingredients/1/']
+        )
+
+    def run_worker(self, mode, paths):
+        result = subprocess.run(
+            [sys.executable, '-c', WORKER_CODE, mode, *paths],
+            env=os.environ.copy(),
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def handle(self, *args, **options):
+        for mode in ('cold', 'warm'):
+            runs = [
+                self.run_worker(mode, options['paths'])
+                for _ in range(options['runs'])
+            ]
+            self.stdout.write(f'{mode}:')
+            for stage in runs[0]:
+                self.stdout.write(
+                    f'  {stage}: '
+                    f'{median(run[stage] for run in runs) * 1000:.1f}ms'
+                )
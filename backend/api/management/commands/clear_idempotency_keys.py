@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from api.idempotency import clear_idempotency_keys
+
+
+class Command(BaseCommand):
+    """Команда для удаления устаревших ответов по Idempotency-Key."""
+
+    def handle(self, *args, **kwargs):
+        count = clear_idempotency_keys()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully removed {count} idempotency keys'
+        ))
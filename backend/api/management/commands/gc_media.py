@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.constants import MEDIA_GC_BATCH_SIZE
+from api.media import collect_garbage
+
+
+class Command(BaseCommand):
+    """Команда для удаления файлов, на которые нет ссылок в базе."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-seconds',
+            type=int,
+            default=settings.MEDIA_GC_GRACE_SECONDS,
+            help='Файлы, измененные позже, не удаляются.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=MEDIA_GC_BATCH_SIZE
+        )
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        checked, deleted = collect_garbage(
+            options['grace_seconds'],
+            options['batch_size'],
+            options['dry_run']
+        )
+        action = 'Found' if options['dry_run'] else 'Deleted'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {deleted} unreferenced files of {checked}'
+        ))
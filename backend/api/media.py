@@ -0,0 +1,87 @@
+import os
+import time
+from itertools import islice
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+
+# Поля моделей, которые ссылаются на файлы в MEDIA_ROOT. У полей есть
+# индексы: ссылки проверяются при каждом освобождении файла и сборке мусора.
+MEDIA_REFERENCES = (
+    ('recipes.Recipe', 'image'),
+    ('users.ApplicationUser', 'avatar'),
+)
+
+
+def get_referenced(names):
+    """Имена из names, на которые ссылается хотя бы одна запись."""
+    referenced = set()
+    for model_name, field in MEDIA_REFERENCES:
+        referenced.update(
+            apps.get_model(model_name).objects.filter(
+                **{f'{field}__in': names}
+            ).values_list(field, flat=True)
+        )
+    return referenced
+
+
+def is_stale(name, grace_seconds):
+    try:
+        modified = os.stat(default_storage.path(name)).st_mtime
+    except FileNotFoundError:
+        return False
+    return time.time() - modified > grace_seconds
+
+
+def release_media(name):
+    """Удаление файла, на который больше не ссылается ни одна запись.
+
+    Ссылки считаются по записям в базе, а не отдельным счетчиком.
+    Файл, использованный повторно за последние MEDIA_GC_GRACE_SECONDS,
+    не удаляется: его могла только что получить другая запись.
+    """
+    if (
+        name
+        and not get_referenced([name])
+        and is_stale(name, settings.MEDIA_GC_GRACE_SECONDS)
+    ):
+        default_storage.delete(name)
+
+
+def iter_media_files(root=None):
+    """Имена файлов MEDIA_ROOT относительно него, без загрузки
+    всего дерева в память.
+    """
+    root = str(root or settings.MEDIA_ROOT)
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield os.path.relpath(entry.path, root).replace(
+                        os.sep, '/'
+                    )
+
+
+def collect_garbage(grace_seconds, batch_size, dry_run=False):
+    """Удаление файлов без ссылок из базы, измененных раньше чем
+    grace_seconds назад. Дерево и база читаются блоками по batch_size.
+    Возвращает число просмотренных и удаленных файлов.
+    """
+    files = iter_media_files()
+    checked = deleted = 0
+    while True:
+        batch = list(islice(files, batch_size))
+        if not batch:
+            return checked, deleted
+        checked += len(batch)
+        referenced = get_referenced(batch)
+        for name in batch:
+            if name not in referenced and is_stale(name, grace_seconds):
+                if not dry_run:
+                    default_storage.delete(name)
+                deleted += 1
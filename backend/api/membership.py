@@ -0,0 +1,93 @@
+from array import array
+
+from django.core.cache import cache
+
+from api.caching import is_cache_shared
+from api.metrics import metrics
+from recipes.models import Favorite, ShoppingCart
+from users.models import Follow
+
+
+GENERATION_CACHE_KEY = 'membership:generation:{}'
+MEMBERSHIP_CACHE_KEY = 'membership:{}:{}'
+MEMBERSHIP_CACHE_TIMEOUT = 30
+
+
+class RecipeMembership:
+    """Id рецептов в избранном и в покупках пользователя
+    и id авторов, на которых он подписан.
+    """
+
+    def __init__(self, favorites, shopping_cart, subscriptions):
+        self.favorites = frozenset(favorites)
+        self.shopping_cart = frozenset(shopping_cart)
+        self.subscriptions = frozenset(subscriptions)
+
+
+def _pack(recipe_ids):
+    return array('q', sorted(recipe_ids)).tobytes()
+
+
+def _unpack(data):
+    recipe_ids = array('q')
+    recipe_ids.frombytes(data)
+    return recipe_ids
+
+
+def load_membership(user):
+    favorites = Favorite.objects.filter(user=user).values_list(
+        'recipe_id', flat=True
+    )
+    shopping_cart = ShoppingCart.objects.filter(user=user).values_list(
+        'recipe_id', flat=True
+    )
+    subscriptions = Follow.objects.filter(user=user).values_list(
+        'following_id', flat=True
+    )
+    return favorites, shopping_cart, subscriptions
+
+
+def get_membership(user):
+    """Избранное, покупки и подписки пользователя из кэша.
+
+    В кэше хранятся отсортированные массивы id под ключом
+    с поколением пользователя, которое меняется при каждой записи.
+    Кэш в памяти процесса не видит записей в других процессах,
+    поэтому без общего кэша данные читаются из базы.
+    """
+    if not is_cache_shared():
+        return RecipeMembership(*load_membership(user))
+
+    generation = cache.get(GENERATION_CACHE_KEY.format(user.pk), 0)
+    key = MEMBERSHIP_CACHE_KEY.format(user.pk, generation)
+    data = cache.get(key)
+
+    if data is not None:
+        metrics.increment('membership_cache.hit')
+        return RecipeMembership(*map(_unpack, data))
+
+    metrics.increment('membership_cache.miss')
+    data = tuple(map(_pack, load_membership(user)))
+    cache.set(key, data, MEMBERSHIP_CACHE_TIMEOUT)
+    return RecipeMembership(*map(_unpack, data))
+
+
+def get_request_membership(request):
+    """Данные текущего пользователя, один раз на запрос."""
+    if request is None or not request.user.is_authenticated:
+        return None
+    if not hasattr(request, 'membership'):
+        request.membership = get_membership(request.user)
+    return request.membership
+
+
+def invalidate_membership(user):
+    """Смена поколения после изменения избранного, покупок
+    или подписок.
+    """
+    key = GENERATION_CACHE_KEY.format(user.pk)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
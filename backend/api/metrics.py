@@ -0,0 +1,25 @@
+import threading
+from collections import Counter
+
+
+class Metrics:
+    """Счетчики метрик в памяти процесса."""
+
+    def __init__(self):
+        self._counters = Counter()
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def set(self, name, value):
+        with self._lock:
+            self._counters[name] = value
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self._counters)
+
+
+metrics = Metrics()
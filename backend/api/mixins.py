@@ -0,0 +1,115 @@
+from contextlib import ExitStack
+
+from django.db import OperationalError
+from rest_framework import permissions, status
+
+from api.db_routers import is_pinned_to_primary, pin_to_primary, replica_reads
+from api.exceptions import QueryDeadlineExceeded
+from api.limits import (HeldLimits, concurrency_slot, is_statement_timeout,
+                        query_deadline)
+from api.prefer import PREFER_RETURN_MINIMAL, prefers_return_minimal
+
+
+class ReplicaReadMixin:
+    """Миксин для чтения с реплик базы данных.
+
+    Безопасные запросы из ``replica_actions`` (все, если не задано)
+    читают с реплик. После записи чтения пользователя на время
+    ``REPLICA_STICKY_SECONDS`` выполняются на основной базе:
+    ответ на запись ставит клиенту подписанную cookie.
+    """
+
+    replica_actions = None
+
+    def dispatch(self, request, *args, **kwargs):
+        token = replica_reads.set(False)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            replica_reads.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+
+        if (
+            request.method in permissions.SAFE_METHODS
+            and (self.replica_actions is None
+                 or self.action in self.replica_actions)
+            and not is_pinned_to_primary(request)
+        ):
+            replica_reads.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if request.method not in permissions.SAFE_METHODS:
+            pin_to_primary(request, response)
+        return response
+
+
+class RequestLimitsMixin:
+    """Миксин для ограничения тяжелых запросов.
+
+    Лимиты задаются в настройках ``CONCURRENCY_LIMITS`` и
+    ``QUERY_TIMEOUTS`` по ключу ``<basename>.<action>``. Для потоковых
+    ответов слот и срок освобождаются, когда тело отдано.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with ExitStack() as stack:
+            self.limits_stack = stack
+            return super().dispatch(request, *args, **kwargs)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        route = self.get_limits_route()
+        self.limits_stack.enter_context(concurrency_slot(route))
+        self.limits_stack.enter_context(query_deadline(route))
+
+    def get_limits_route(self):
+        return f'{self.basename}.{self.action}'
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if response.streaming:
+            response.streaming_content = HeldLimits(
+                response.streaming_content, self.limits_stack.pop_all()
+            )
+        return response
+
+    def handle_exception(self, exc):
+        if isinstance(exc, OperationalError) and is_statement_timeout(exc):
+            exc = QueryDeadlineExceeded()
+        return super().handle_exception(exc)
+
+
+class ReturnMinimalMixin:
+    """Миксин для кратких ответов на запись.
+
+    Действия из ``minimal_actions`` по заголовку
+    ``Prefer: return=minimal`` возвращают только id записи,
+    без повторного чтения объекта для полного ответа.
+    """
+
+    minimal_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        request.return_minimal = (
+            self.action in self.minimal_actions
+            and prefers_return_minimal(request)
+        )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if (
+            getattr(request, 'return_minimal', False)
+            and status.is_success(response.status_code)
+        ):
+            response['Preference-Applied'] = PREFER_RETURN_MINIMAL
+        return response
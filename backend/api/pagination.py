@@ -1,8 +1,11 @@
 from rest_framework.pagination import PageNumberPagination
 
+from api.constants import MAX_PAGE_SIZE
+
 
 class WithLimitPagination(PageNumberPagination):
     """Кастомная пагинация с лимитом."""
 
     page_size_query_param = 'limit'
     page_size = 6
+    max_page_size = MAX_PAGE_SIZE
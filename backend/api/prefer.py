@@ -0,0 +1,19 @@
+PREFER_RETURN_MINIMAL = 'return=minimal'
+
+
+def prefers_return_minimal(request):
+    """Клиент просит краткий ответ: заголовок Prefer: return=minimal
+    (RFC 7240) или параметр запроса return=minimal.
+    """
+    if request.query_params.get('return') == 'minimal':
+        return True
+    for preference in request.META.get('HTTP_PREFER', '').split(','):
+        token = preference.split(';')[0].strip().lower().replace('"', '')
+        if token.replace(' ', '') == PREFER_RETURN_MINIMAL:
+            return True
+    return False
+
+
+def is_return_minimal(context):
+    """Сериализатору нужно вернуть только id записи."""
+    return getattr(context.get('request'), 'return_minimal', False)
@@ -1,12 +1,22 @@
+from functools import partial
+
 from django.contrib.auth import get_user_model
 from django.db import transaction
 from djoser.serializers import UserSerializer as DjoserUserSerializer
 from rest_framework import serializers
 
-from api.constants import REQUIRED_FIELDS_FOR_UPDATE
+from api.constants import (MAX_BULK_SIZE, MAX_STREAM_SIZE,
+                           REQUIRED_FIELDS_FOR_UPDATE)
+from api.list_cache import invalidate_recipe_lists
+from api.membership import get_request_membership
+from api.prefer import is_return_minimal
 from api.serializers_fields import Base64ImageField
+from recipes.catalog import get_catalog
+from recipes.changes import parse_cursor
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             ShoppingCart, Tag)
+from recipes.pantry import invalidate_pantry_index
+from recipes.timeline import schedule_fan_out
 from users.models import Follow
 
 
@@ -48,14 +58,8 @@ class UserSerializer(DjoserUserSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        return (
-            request
-            and request.user.is_authenticated
-            and Follow.objects.filter(
-                user=request.user, following=obj
-            ).exists()
-        )
+        membership = get_request_membership(self.context.get('request'))
+        return membership is not None and obj.id in membership.subscriptions
 
 
 class TagSerializer(serializers.ModelSerializer):
@@ -66,6 +70,15 @@ class TagSerializer(serializers.ModelSerializer):
         fields = ('id', 'slug', 'name')
 
 
+class TagFacetSerializer(TagSerializer):
+    """Сериализатор для тегов с числом рецептов."""
+
+    count = serializers.IntegerField(source='recipes_count')
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ('count',)
+
+
 class IngredientSerializer(serializers.ModelSerializer):
     """Сериализатор для ингредиентов."""
 
@@ -91,6 +104,23 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         model = RecipeIngredient
         fields = ('id', 'amount', 'measurement_unit', 'name')
 
+    def to_representation(self, instance):
+        """Название и единица измерения из снимка каталога,
+        без загрузки ингредиента из базы.
+        """
+        ingredient = get_catalog().ingredient(instance.ingredient_id)
+        if ingredient is None:
+            ingredient = {
+                'name': instance.ingredient.name,
+                'measurement_unit': instance.ingredient.measurement_unit,
+            }
+        return {
+            'id': instance.ingredient_id,
+            'amount': instance.amount,
+            'measurement_unit': ingredient['measurement_unit'],
+            'name': ingredient['name'],
+        }
+
 
 class RecipeReadSerializer(serializers.ModelSerializer):
     """Сериализатор для чтения рецептов."""
@@ -118,20 +148,12 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         )
 
     def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        return (
-            request
-            and request.user.is_authenticated
-            and obj.favorite.filter(user=request.user).exists()
-        )
+        membership = get_request_membership(self.context.get('request'))
+        return membership is not None and obj.id in membership.favorites
 
     def get_is_in_shopping_cart(self, obj):
-        request = self.context.get('request')
-        return (
-            request
-            and request.user.is_authenticated
-            and obj.shopping_cart.filter(user=request.user).exists()
-        )
+        membership = get_request_membership(self.context.get('request'))
+        return membership is not None and obj.id in membership.shopping_cart
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
@@ -223,6 +245,9 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         )
         recipe.tags.set(tags_data)
         self.create_recipe_ingredients(ingredients_data, recipe)
+        transaction.on_commit(partial(schedule_fan_out, recipe.id))
+        transaction.on_commit(invalidate_pantry_index)
+        transaction.on_commit(invalidate_recipe_lists)
         return recipe
 
     @transaction.atomic
@@ -235,9 +260,13 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         # метод clear не поддерживается
         instance.ingredients.all().delete()
         self.create_recipe_ingredients(ingredients_data, instance)
+        transaction.on_commit(invalidate_pantry_index)
+        transaction.on_commit(invalidate_recipe_lists)
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        if is_return_minimal(self.context):
+            return {'id': instance.id}
         return RecipeReadSerializer(instance, context=self.context).data
 
 
@@ -264,6 +293,8 @@ class FavoriteSerializer(serializers.ModelSerializer):
         ]
 
     def to_representation(self, instance):
+        if is_return_minimal(self.context):
+            return {'id': instance.recipe_id}
         return RecipeShortSerializer(instance.recipe).data
 
 
@@ -282,6 +313,8 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         ]
 
     def to_representation(self, instance):
+        if is_return_minimal(self.context):
+            return {'id': instance.recipe_id}
         return RecipeShortSerializer(instance.recipe).data
 
 
@@ -311,6 +344,8 @@ class FollowSerializer(serializers.ModelSerializer):
         return data
 
     def to_representation(self, instance):
+        if is_return_minimal(self.context):
+            return {'id': instance.following_id}
         return FollowListSerializer(
             instance.following, context=self.context
         ).data
@@ -358,3 +393,68 @@ class FollowListSerializer(UserSerializer):
         else:
             recipes = obj.recipes.all()
         return RecipeShortSerializer(recipes, many=True).data
+
+
+class BulkChangeSerializer(serializers.Serializer):
+    """Сериализатор для массового добавления и удаления связей."""
+
+    add = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        max_length=MAX_BULK_SIZE,
+        required=False,
+        default=list
+    )
+    remove = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        max_length=MAX_BULK_SIZE,
+        required=False,
+        default=list
+    )
+
+    def validate(self, data):
+        add_ids = list(dict.fromkeys(data['add']))
+        remove_ids = list(dict.fromkeys(data['remove']))
+
+        if not add_ids and not remove_ids:
+            raise serializers.ValidationError(
+                'Необходимо указать "add" или "remove".'
+            )
+
+        if set(add_ids) & set(remove_ids):
+            raise serializers.ValidationError(
+                'Один и тот же id не может быть в "add" и "remove".'
+            )
+
+        return {'add': add_ids, 'remove': remove_ids}
+
+
+class PantrySearchSerializer(serializers.Serializer):
+    """Сериализатор параметров поиска рецептов по имеющимся ингредиентам."""
+
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        min_length=1,
+        max_length=MAX_BULK_SIZE
+    )
+    max_missing = serializers.IntegerField(min_value=0, default=0)
+
+
+class ChangesQuerySerializer(serializers.Serializer):
+    """Сериализатор параметров запроса журнала изменений."""
+
+    since = serializers.CharField(required=False)
+
+    def validate_since(self, value):
+        try:
+            return parse_cursor(value)
+        except (ValueError, OverflowError, OSError):
+            raise serializers.ValidationError('Некорректный курсор.')
+
+
+class StreamListSerializer(serializers.Serializer):
+    """Сериализатор параметров потоковой выдачи списка."""
+
+    stream = serializers.BooleanField()
+    limit = serializers.IntegerField(
+        min_value=1, max_value=MAX_STREAM_SIZE, default=MAX_STREAM_SIZE
+    )
@@ -0,0 +1,96 @@
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.signals import request_finished, request_started
+from django.db.backends.signals import connection_created
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import token_cache
+from api.db_connections import (check_reused_connections,
+                                release_excess_connections,
+                                track_opened_connection)
+from api.list_cache import touch_recipes
+from api.media import MEDIA_REFERENCES, release_media
+from recipes.models import Ingredient, Recipe, Tag
+
+
+User = get_user_model()
+MEDIA_FIELDS = {
+    apps.get_model(model_name): field
+    for model_name, field in MEDIA_REFERENCES
+}
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Сброс кэша при выходе пользователя."""
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_tokens(sender, instance, **kwargs):
+    """Сброс кэша при смене пароля, деактивации или удалении."""
+    token_cache.invalidate_user(instance.pk)
+
+
+@receiver(connection_created)
+def count_opened_connection(sender, connection, **kwargs):
+    track_opened_connection(connection)
+
+
+@receiver(request_started)
+def check_connections_before_reuse(sender, **kwargs):
+    check_reused_connections()
+
+
+@receiver(request_finished)
+def release_connections_over_limit(sender, **kwargs):
+    release_excess_connections()
+
+
+@receiver(post_save, sender=Tag)
+def touch_tag_recipes(sender, instance, created, **kwargs):
+    """Новое время изменения рецептов с переименованным тегом."""
+    if not created:
+        touch_recipes(Recipe.objects.filter(tags=instance))
+
+
+@receiver(post_save, sender=Ingredient)
+def touch_ingredient_recipes(sender, instance, created, **kwargs):
+    if not created:
+        touch_recipes(
+            Recipe.objects.filter(ingredients__ingredient=instance)
+        )
+
+
+def remember_media(sender, instance, update_fields=None, **kwargs):
+    """Прежнее имя файла перед сохранением записи."""
+    field = MEDIA_FIELDS[sender]
+    if instance.pk is None or (
+        update_fields is not None and field not in update_fields
+    ):
+        return
+    instance._previous_media = sender.objects.filter(
+        pk=instance.pk
+    ).values_list(field, flat=True).first()
+
+
+def release_replaced_media(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_media', None)
+    if previous and previous != getattr(instance, MEDIA_FIELDS[sender]).name:
+        transaction.on_commit(lambda: release_media(previous))
+
+
+def release_deleted_media(sender, instance, **kwargs):
+    name = getattr(instance, MEDIA_FIELDS[sender]).name
+    if name:
+        transaction.on_commit(lambda: release_media(name))
+
+
+for model in MEDIA_FIELDS:
+    pre_save.connect(remember_media, sender=model)
+    post_save.connect(release_replaced_media, sender=model)
+    post_delete.connect(release_deleted_media, sender=model)
@@ -0,0 +1,60 @@
+from itertools import islice
+
+from django.http import StreamingHttpResponse
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+
+from api.constants import STREAM_CHUNK_SIZE
+
+
+def is_stream_requested(request):
+    """Параметр stream запроса с истинным значением."""
+    try:
+        return serializers.BooleanField().to_internal_value(
+            request.query_params.get('stream', False)
+        )
+    except serializers.ValidationError:
+        return False
+
+
+def iter_chunks(queryset, limit=None, chunk_size=STREAM_CHUNK_SIZE):
+    """Объекты queryset блоками по chunk_size в его порядке.
+
+    Сначала загружаются только id, затем каждый блок отдельным
+    запросом со своими select_related и prefetch_related:
+    iterator() их не поддерживает.
+    """
+    ids = queryset.values_list('id', flat=True)
+    if limit is not None:
+        ids = ids[:limit]
+    ids = iter(list(ids))
+    while True:
+        chunk_ids = list(islice(ids, chunk_size))
+        if not chunk_ids:
+            return
+        objects = queryset.in_bulk(chunk_ids)
+        yield [objects[obj_id] for obj_id in chunk_ids if obj_id in objects]
+
+
+def iter_json_list(chunks, serializer_class, context):
+    """JSON списка в формате пагинации, по одному объекту за раз.
+
+    В памяти одновременно только один сериализованный блок.
+    """
+    renderer = JSONRenderer()
+    yield b'{"next":null,"previous":null,"results":['
+    count = 0
+    for chunk in chunks:
+        for data in serializer_class(chunk, many=True, context=context).data:
+            yield (b',' if count else b'') + renderer.render(data)
+            count += 1
+    yield b'],"count":%d}' % count
+
+
+def streaming_json_response(queryset, serializer_class, context, limit=None):
+    return StreamingHttpResponse(
+        iter_json_list(
+            iter_chunks(queryset, limit), serializer_class, context
+        ),
+        content_type='application/json'
+    )
@@ -0,0 +1,696 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from functools import partial
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import CachedTokenAuthentication, token_cache
+from api.bulk import (BULK_ABSENT, BULK_ADDED, BULK_EXISTS, BULK_FORBIDDEN,
+                      BULK_NOT_FOUND, BULK_REMOVED, apply_bulk_changes)
+from api.db_routers import STICKY_COOKIE
+from api.constants import (MEDIA_CACHE_CONTROL, MEDIA_IMMUTABLE_CACHE_CONTROL,
+                           TAGS_MATCH_ALL, TAGS_MATCH_ANY)
+from api.filters import RecipesFilter
+from recipes.changes import compact_changes, get_changes
+from recipes import pantry
+from recipes.models import (Change, Favorite, IdempotencyKey, Ingredient,
+                            Recipe, RecipeIngredient, SimilarRecipes, Tag,
+                            TimelineEntry)
+from recipes.similarity import (build_matrix, get_affected_rows,
+                                load_recipe_ingredient_pairs, pack_neighbours)
+from recipes.timeline import schedule_fan_out
+from users.models import Follow
+
+
+User = get_user_model()
+PASSWORD = 'Secret-pass-123'
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Отзыв закэшированных токенов."""
+
+    def setUp(self):
+        token_cache.clear()
+        self.user = User.objects.create_user(
+            username='cook',
+            email='cook@example.com',
+            password=PASSWORD,
+            first_name='Имя',
+            last_name='Фамилия'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+
+    def test_logout_revokes_token(self):
+        response = self.client.post('/api/auth/token/logout/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_password_change_drops_cached_user(self):
+        new_password = 'Another-pass-456'
+        response = self.client.post('/api/users/set_password/', {
+            'current_password': PASSWORD,
+            'new_password': new_password,
+        })
+        self.assertEqual(response.status_code, 204)
+        self.assertIsNone(token_cache.get(self.token.key))
+        user, _ = CachedTokenAuthentication().authenticate_credentials(
+            self.token.key
+        )
+        self.assertTrue(user.check_password(new_password))
+
+    def test_deactivation_revokes_token(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
+
+    def test_update_in_other_worker_revoked_after_ttl(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        expired = time.monotonic() + settings.TOKEN_CACHE_TTL + 1
+        with mock.patch('api.authentication.time.monotonic',
+                        return_value=expired):
+            response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_requests_get_separate_user_instances(self):
+        authentication = CachedTokenAuthentication()
+        user, token = authentication.authenticate_credentials(self.token.key)
+        user.first_name = 'Изменено'
+        user.is_active = False
+        cached_user, cached_token = authentication.authenticate_credentials(
+            self.token.key
+        )
+        self.assertIsNot(cached_user, user)
+        self.assertEqual(cached_user.first_name, 'Имя')
+        self.assertTrue(cached_user.is_active)
+        self.assertIs(cached_token.user, cached_user)
+        self.assertEqual(cached_token.key, self.token.key)
+
+
+class RecipeTagsFilterTests(TestCase):
+    """Фильтрация рецептов по нескольким тегам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password=PASSWORD
+        )
+        cls.breakfast, cls.dinner, cls.vegan = (
+            Tag.objects.create(name=slug, slug=slug)
+            for slug in ('breakfast', 'dinner', 'vegan')
+        )
+        recipe_tags = {
+            'both': (cls.breakfast, cls.vegan),
+            'breakfast': (cls.breakfast,),
+            'vegan': (cls.vegan,),
+            'dinner': (cls.dinner,),
+        }
+        for name, tags in recipe_tags.items():
+            recipe = Recipe.objects.create(
+                author=author,
+                name=name,
+                text='text',
+                image='recipes/image.png',
+                cooking_time=10
+            )
+            recipe.tags.set(tags)
+
+    def get_names(self, tags_match=None):
+        params = {'tags': ['breakfast', 'vegan']}
+        if tags_match:
+            params['tags_match'] = tags_match
+        response = APIClient().get('/api/recipes/', params)
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        names = [recipe['name'] for recipe in data['results']]
+        self.assertEqual(data['count'], len(names))
+        return names
+
+    def test_any_returns_each_recipe_once(self):
+        for tags_match in (None, TAGS_MATCH_ANY):
+            names = self.get_names(tags_match)
+            self.assertEqual(len(names), len(set(names)))
+            self.assertCountEqual(names, ['both', 'breakfast', 'vegan'])
+
+    def test_all_requires_every_tag(self):
+        self.assertEqual(self.get_names(TAGS_MATCH_ALL), ['both'])
+
+    @skipUnless(
+        connection.vendor == 'postgresql',
+        'План запроса проверяется в PostgreSQL'
+    )
+    def test_filter_uses_semi_join(self):
+        for tags_match in (TAGS_MATCH_ANY, TAGS_MATCH_ALL):
+            data = {'tags': ['breakfast', 'vegan'], 'tags_match': tags_match}
+            queryset = RecipesFilter(data, queryset=Recipe.objects.all()).qs
+            self.assertIn('EXISTS', str(queryset.query))
+            self.assertNotIn('"recipes_tag"', str(queryset.query))
+            self.assertRegex(
+                queryset.explain(verbose=True),
+                r'Semi Join|Inner Unique: true|SubPlan'
+            )
+
+
+class MediaViewTests(TestCase):
+    """Отдача файлов, на которые ссылаются записи."""
+
+    content_name = f'recipes/ab/{"ab" * 32}.png'
+    legacy_name = 'recipes/old photo.png'
+    content = b'image'
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password=PASSWORD
+        )
+        for name in (self.content_name, self.legacy_name, 'recipes/lost.png'):
+            path = os.path.join(media_root, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as file:
+                file.write(self.content)
+        for name in (self.content_name, self.legacy_name):
+            Recipe.objects.create(
+                author=author,
+                name=name,
+                text='text',
+                image=name,
+                cooking_time=10
+            )
+        self.client = APIClient()
+
+    def get(self, name, params=None):
+        return self.client.get(f'/api/media/{name}', params)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT=True)
+    def test_accel_redirect(self):
+        response = self.get(self.legacy_name)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            '/protected-media/recipes/old%20photo.png'
+        )
+        self.assertEqual(response['Content-Type'], 'image/png')
+        self.assertEqual(response.content, b'')
+
+    @override_settings(MEDIA_ACCEL_REDIRECT=False)
+    def test_file_served_without_accel_redirect(self):
+        response = self.get(self.legacy_name)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Accel-Redirect', response)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        response.close()
+
+    def test_cache_control(self):
+        for accel_redirect in (True, False):
+            cases = (
+                (self.content_name, None, MEDIA_IMMUTABLE_CACHE_CONTROL),
+                (self.legacy_name, {'v': '2'}, MEDIA_IMMUTABLE_CACHE_CONTROL),
+                (self.legacy_name, None, MEDIA_CACHE_CONTROL),
+            )
+            for name, params, cache_control in cases:
+                with self.subTest(name=name, params=params,
+                                  accel_redirect=accel_redirect):
+                    with override_settings(
+                        MEDIA_ACCEL_REDIRECT=accel_redirect
+                    ):
+                        response = self.get(name, params)
+                    self.assertEqual(response['Cache-Control'], cache_control)
+                    response.close()
+
+    def test_unreferenced_name_not_found(self):
+        for accel_redirect in (True, False):
+            with override_settings(MEDIA_ACCEL_REDIRECT=accel_redirect):
+                response = self.get('recipes/lost.png')
+            self.assertEqual(response.status_code, 404)
+
+
+@override_settings(
+    TIMELINE_FANOUT_ASYNC=True, TIMELINE_FANOUT_SYNC_MAX_FOLLOWERS=1
+)
+class TimelineFanOutTests(TestCase):
+    """Рассылка новых рецептов по лентам подписчиков."""
+
+    def setUp(self):
+        self.author, *self.followers = (
+            User.objects.create_user(
+                username=f'user{index}',
+                email=f'user{index}@example.com',
+                password=PASSWORD
+            )
+            for index in range(3)
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author,
+            name='recipe',
+            text='text',
+            image='recipes/image.png',
+            cooking_time=10
+        )
+        executor = mock.patch('recipes.timeline._executor')
+        self.executor = executor.start()
+        self.addCleanup(executor.stop)
+
+    def follow(self, followers):
+        Follow.objects.bulk_create(
+            Follow(user=follower, following=self.author)
+            for follower in followers
+        )
+
+    def test_small_fan_out_runs_in_request(self):
+        self.follow(self.followers[:1])
+        schedule_fan_out(self.recipe.id)
+        self.executor.submit.assert_not_called()
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.followers[0], recipe=self.recipe
+        ).exists())
+
+    def test_lost_background_fan_out_is_replayed(self):
+        self.follow(self.followers)
+        schedule_fan_out(self.recipe.id)
+        self.executor.submit.assert_called_once()
+        self.assertFalse(TimelineEntry.objects.exists())
+        call_command('rebuild_timeline', since_hours=1, stdout=StringIO())
+        self.assertCountEqual(
+            TimelineEntry.objects.values_list('user_id', flat=True),
+            [follower.id for follower in self.followers]
+        )
+
+
+class ChangeLogTests(TestCase):
+    """Журнал изменений для синхронизации клиентов."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='cook',
+            email='cook@example.com',
+            password=PASSWORD
+        )
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.user,
+                name=f'recipe{index}',
+                text='text',
+                image='recipes/image.png',
+                cooking_time=10
+            )
+            for index in range(3)
+        ]
+        self.recipe_ids = [recipe.id for recipe in self.recipes]
+        Change.objects.all().delete()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get_favorite_changes(self):
+        return list(Change.objects.filter(
+            entity=Change.FAVORITE, user=self.user
+        ).order_by('id').values_list('object_id', 'deleted'))
+
+    def test_single_favorite_changes_logged(self):
+        recipe_id = self.recipe_ids[0]
+        url = f'/api/recipes/{recipe_id}/favorite/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+        self.assertEqual(
+            self.get_favorite_changes(),
+            [(recipe_id, False), (recipe_id, True)]
+        )
+
+    def test_bulk_favorite_changes_logged(self):
+        url = '/api/recipes/favorite_bulk/'
+        self.client.post(url, {'add': self.recipe_ids}, format='json')
+        self.client.post(
+            url, {'remove': self.recipe_ids[:2]}, format='json'
+        )
+        self.assertEqual(
+            self.get_favorite_changes(),
+            [(recipe_id, False) for recipe_id in self.recipe_ids]
+            + [(recipe_id, True) for recipe_id in self.recipe_ids[:2]]
+        )
+
+    def log_tag_changes(self, count, age):
+        """count изменений тегов, записанных age назад."""
+        Change.objects.bulk_create(
+            Change(entity=Change.TAG, object_id=object_id)
+            for object_id in range(1, count + 1)
+        )
+        Change.objects.update(created=timezone.now() - age)
+
+    def get_page(self, cursor):
+        with mock.patch(
+            'api.views.get_changes', partial(get_changes, limit=2)
+        ):
+            return self.client.get('/api/changes/', {'since': cursor})
+
+    def test_cursor_pages_through_backlog(self):
+        self.log_tag_changes(5, timedelta(minutes=1))
+        cursor = f'0.{int(timezone.now().timestamp())}'
+        deleted_ids, has_more = [], True
+        while has_more:
+            data = self.get_page(cursor).json()
+            deleted_ids += data['changes']['tags']['deleted']
+            cursor, has_more = data['next'], data['has_more']
+        self.assertEqual(deleted_ids, [1, 2, 3, 4, 5])
+        self.assertFalse(self.get_page(cursor).json()['has_more'])
+
+    def test_cursor_expires_with_unread_changes(self):
+        retention = timedelta(days=settings.CHANGES_RETENTION_DAYS)
+        self.log_tag_changes(3, retention - timedelta(hours=1))
+        cursor = f'0.{int(timezone.now().timestamp())}'
+        first_page = self.get_page(cursor).json()
+        self.assertTrue(first_page['has_more'])
+
+        later = timezone.now() + timedelta(hours=2)
+        with mock.patch('django.utils.timezone.now', return_value=later):
+            compact_changes()
+            response = self.get_page(first_page['next'])
+        self.assertEqual(response.status_code, 410)
+
+
+class PantrySearchTests(TestCase):
+    """Поиск рецептов по имеющимся ингредиентам."""
+
+    def setUp(self):
+        pantry._index = None
+        self.addCleanup(setattr, pantry, '_index', None)
+        self.author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password=PASSWORD
+        )
+        self.ingredient = Ingredient.objects.create(
+            name='salt', measurement_unit='g'
+        )
+        self.recipes = []
+        for index in range(3):
+            recipe = Recipe.objects.create(
+                author=self.author,
+                name=f'recipe{index}',
+                text='text',
+                image='recipes/image.png',
+                cooking_time=10
+            )
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=self.ingredient, amount=1
+            )
+            self.recipes.append(recipe)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def search(self):
+        response = self.client.get(
+            '/api/recipes/pantry/', {'ingredients': self.ingredient.id}
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['count'], len(data['results']))
+        return sorted(recipe['id'] for recipe in data['results'])
+
+    def test_deleted_recipe_leaves_index(self):
+        self.assertEqual(
+            self.search(), sorted(recipe.id for recipe in self.recipes)
+        )
+        deleted = self.recipes.pop()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/recipes/{deleted.id}/')
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(
+            self.search(), sorted(recipe.id for recipe in self.recipes)
+        )
+
+
+class BulkChangesTests(TestCase):
+    """Массовое изменение избранного."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='cook',
+            email='cook@example.com',
+            password=PASSWORD
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=cls.user,
+                name=f'recipe{index}',
+                text='text',
+                image='recipes/image.png',
+                cooking_time=10,
+                short_link=f'link{index}'
+            )
+            for index in range(50)
+        )
+        cls.recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        cls.missing_id = max(cls.recipe_ids) + 1
+
+    def apply(self, add_ids=(), remove_ids=(), forbidden_ids=()):
+        return apply_bulk_changes(
+            self.user, Favorite, Recipe, 'recipe',
+            add_ids, remove_ids, forbidden_ids
+        )
+
+    def test_query_count_does_not_depend_on_size(self):
+        # Точка сохранения, выборка рецептов и связей, одна запись
+        # в таблицу связей, одна в журнал, освобождение точки.
+        for size in (1, 50):
+            recipe_ids = self.recipe_ids[:size]
+            with self.subTest(size=size):
+                with self.assertNumQueries(6):
+                    self.apply(add_ids=recipe_ids)
+                self.assertEqual(Favorite.objects.count(), size)
+                with self.assertNumQueries(6):
+                    self.apply(remove_ids=recipe_ids)
+                self.assertFalse(Favorite.objects.exists())
+
+    def test_outcomes(self):
+        added_id, existing_id, forbidden_id, removed_id, absent_id = (
+            self.recipe_ids[:5]
+        )
+        self.apply(add_ids=[existing_id, removed_id])
+        results = self.apply(
+            add_ids=[added_id, existing_id, forbidden_id, self.missing_id],
+            remove_ids=[removed_id, absent_id, self.missing_id],
+            forbidden_ids={forbidden_id}
+        )
+        self.assertEqual(results, [
+            {'id': added_id, 'status': BULK_ADDED},
+            {'id': existing_id, 'status': BULK_EXISTS},
+            {'id': forbidden_id, 'status': BULK_FORBIDDEN},
+            {'id': self.missing_id, 'status': BULK_NOT_FOUND},
+            {'id': removed_id, 'status': BULK_REMOVED},
+            {'id': absent_id, 'status': BULK_ABSENT},
+            {'id': self.missing_id, 'status': BULK_NOT_FOUND},
+        ])
+        self.assertCountEqual(
+            Favorite.objects.values_list('recipe_id', flat=True),
+            [added_id, existing_id]
+        )
+
+
+class SimilarRecipesTests(TestCase):
+    """Пересчет похожих рецептов после изменения."""
+
+    def test_affected_rows(self):
+        author = User.objects.create_user(
+            username='author',
+            email='author@example.com',
+            password=PASSWORD
+        )
+        ingredients = [
+            Ingredient.objects.create(name=f'i{index}', measurement_unit='g')
+            for index in range(4)
+        ]
+        recipe_ingredients = {
+            'changed': (0, 1),
+            'shares_ingredient': (0,),
+            'lists_changed': (2,),
+            'unrelated': (3,),
+        }
+        recipes = {}
+        for name, indexes in recipe_ingredients.items():
+            recipes[name] = Recipe.objects.create(
+                author=author,
+                name=name,
+                text='text',
+                image='recipes/image.png',
+                cooking_time=10
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(
+                    recipe=recipes[name],
+                    ingredient=ingredients[index],
+                    amount=1
+                )
+                for index in indexes
+            )
+        SimilarRecipes.objects.create(
+            recipe=recipes['lists_changed'],
+            neighbours=pack_neighbours([recipes['changed'].id], [0.5]),
+            computed_at=timezone.now()
+        )
+
+        recipe_ids, matrix, _ = build_matrix(load_recipe_ingredient_pairs())
+        rows = get_affected_rows(
+            recipe_ids, matrix, [recipes['changed'].id]
+        )
+        self.assertCountEqual(recipe_ids[rows].tolist(), [
+            recipes[name].id
+            for name in ('changed', 'shares_ingredient', 'lists_changed')
+        ])
+
+
+class IdempotencyKeyTests(TestCase):
+    """Повторы запросов с заголовком Idempotency-Key."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='cook',
+            email='cook@example.com',
+            password=PASSWORD
+        )
+        self.recipe, self.other_recipe = (
+            Recipe.objects.create(
+                author=self.user,
+                name=f'recipe{index}',
+                text='text',
+                image='recipes/image.png',
+                cooking_time=10
+            )
+            for index in range(2)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.client.credentials(HTTP_IDEMPOTENCY_KEY='key-1')
+
+    def favorite(self, recipe=None):
+        recipe = recipe or self.recipe
+        return self.client.post(f'/api/recipes/{recipe.id}/favorite/')
+
+    def test_replay_returns_stored_response(self):
+        first = self.favorite()
+        self.assertEqual(first.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', first)
+        replayed = self.favorite()
+        self.assertEqual(replayed.status_code, 201)
+        self.assertEqual(replayed['Idempotent-Replayed'], 'true')
+        self.assertEqual(replayed.json(), first.json())
+        self.assertEqual(Favorite.objects.count(), 1)
+
+    def test_key_reused_for_other_request(self):
+        self.assertEqual(self.favorite().status_code, 201)
+        response = self.favorite(self.other_recipe)
+        self.assertEqual(response.status_code, 422)
+        self.assertFalse(
+            Favorite.objects.filter(recipe=self.other_recipe).exists()
+        )
+
+    def test_key_in_flight(self):
+        self.favorite()
+        # Первый запрос еще выполняется: ответа в записи нет.
+        IdempotencyKey.objects.update(status_code=None, response=None)
+        self.assertEqual(self.favorite().status_code, 409)
+
+    def test_abandoned_claim_taken_over(self):
+        self.favorite()
+        # Процесс первого запроса умер до коммита избранного.
+        Favorite.objects.all().delete()
+        IdempotencyKey.objects.update(
+            status_code=None,
+            response=None,
+            created=timezone.now() - timedelta(
+                seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT + 1
+            )
+        )
+        response = self.favorite()
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', response)
+        self.assertEqual(Favorite.objects.count(), 1)
+        self.assertEqual(
+            IdempotencyKey.objects.get().status_code, response.status_code
+        )
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Чтения с реплики и чтение своих записей с основной базы.
+
+    Реплика в тестах - зеркало основной базы в отдельном соединении,
+    поэтому данные должны быть закоммичены: TestCase держит их
+    в незавершенной транзакции.
+    """
+
+    databases = {'default', 'replica_0'}
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='cook',
+            email='cook@example.com',
+            password=PASSWORD
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.user,
+            name='recipe',
+            text='text',
+            image='recipes/image.png',
+            cooking_time=10
+        )
+        self.client = APIClient()
+
+    def get_databases(self, path):
+        """Псевдонимы баз, к которым обращался запрос."""
+        with CaptureQueriesContext(connections['default']) as primary:
+            with CaptureQueriesContext(connections['replica_0']) as replica:
+                response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return {
+            alias for alias, queries in (
+                ('default', primary), ('replica_0', replica)
+            )
+            if len(queries)
+        }
+
+    def test_anonymous_reads_from_replica(self):
+        self.assertEqual(
+            self.get_databases(f'/api/recipes/{self.recipe.id}/'),
+            {'replica_0'}
+        )
+
+    def test_reads_after_write_from_primary(self):
+        self.client.force_authenticate(self.user)
+        path = f'/api/recipes/{self.recipe.id}/'
+        self.assertEqual(self.get_databases(path), {'replica_0'})
+
+        response = self.client.post(f'{path}favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        # Отметка в кэше процесса не должна влиять на проверку cookie.
+        cache.clear()
+        self.assertEqual(self.get_databases(path), {'default'})
+
+        del self.client.cookies[STICKY_COOKIE]
+        self.assertEqual(self.get_databases(path), {'replica_0'})
@@ -1,8 +1,8 @@
 from django.urls import include, path
 from rest_framework import routers
 
-from api.views import (ApplicationUserViewSet, IngredientViewSet,
-                       RecipeViewSet, TagViewSet)
+from api.views import (ApplicationUserViewSet, ChangesView, IngredientViewSet,
+                       MediaView, MetricsView, RecipeViewSet, TagViewSet)
 
 
 v1_router = routers.DefaultRouter()
@@ -14,4 +14,7 @@ v1_router.register('recipes', RecipeViewSet, basename='recipes')
 urlpatterns = [
     path('', include(v1_router.urls)),
     path('auth/', include('djoser.urls.authtoken')),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('changes/', ChangesView.as_view(), name='changes'),
+    path('media/<path:name>', MediaView.as_view(), name='media'),
 ]
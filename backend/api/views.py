@@ -1,36 +1,81 @@
+import mimetypes
 from io import StringIO
+from urllib.parse import quote, urlencode
 
+from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
 from django.db.models import Sum
-from django.http import HttpResponse
+from django.http import FileResponse, Http404, HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import patch_vary_headers
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import permissions, status, viewsets
 from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
-
-from api.filters import IngredientFilter, RecipesFilter
+from rest_framework.views import APIView
+
+from api.bulk import BULK_ADDED, BULK_REMOVED, apply_bulk_changes
+from api.caching import hash_key
+from api.coalescing import coalesce
+from api.compression import get_accepted_encoding
+from api.conditional import (etag_matches, get_list_etag, get_recipe_etag,
+                             set_validators)
+from api.constants import (FACETS_CACHE_TIMEOUT, MAX_STREAM_SIZE,
+                           MEDIA_CACHE_CONTROL, MEDIA_IMMUTABLE_CACHE_CONTROL)
+from api.exceptions import ChangesCursorExpired
+from api.filters import IngredientFilter, RecipesFilter, count_tag_facets
+from api.idempotency import idempotent
+from api.list_cache import (cache_list, get_cached_list, get_compressed_list,
+                            get_detail_cache_key, get_list_cache_key,
+                            invalidate_recipe_lists, is_list_cacheable,
+                            personalize_detail, personalize_list, share_recipe,
+                            touch_recipes)
+from api.media import get_referenced
+from api.membership import get_request_membership, invalidate_membership
+from api.metrics import metrics
+from api.mixins import ReplicaReadMixin, RequestLimitsMixin, ReturnMinimalMixin
 from api.pagination import WithLimitPagination
 from api.permissions import IsAuthorOrReadOnly
-from api.serializers import (AvatarSerializer, FavoriteSerializer,
+from api.serializers import (AvatarSerializer, BulkChangeSerializer,
+                             ChangesQuerySerializer, FavoriteSerializer,
                              FollowListSerializer, FollowSerializer,
-                             IngredientSerializer, RecipeReadSerializer,
+                             IngredientSerializer, PantrySearchSerializer,
+                             RecipeReadSerializer, RecipeShortSerializer,
                              RecipeWriteSerializer, ShoppingCartSerializer,
+                             StreamListSerializer, TagFacetSerializer,
                              TagSerializer)
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from api.streaming import is_stream_requested, streaming_json_response
+from backend.storage import is_content_name
+from recipes.catalog import get_catalog
+from recipes.changes import (USER_ITEM_ENTITIES, get_changes,
+                             get_last_change_id, is_cursor_expired,
+                             make_cursor, record_changes)
+from recipes.models import (Change, Favorite, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from recipes.pantry import get_pantry_index, invalidate_pantry_index
+from recipes.similarity import get_similar_recipe_ids
+from recipes.timeline import (backfill_timeline, get_feed_queryset,
+                              prune_timeline)
+from recipes.trending import bump_trending
 from users.models import Follow
 
 
 User = get_user_model()
 
 
-class ApplicationUserViewSet(UserViewSet):
+class ApplicationUserViewSet(ReplicaReadMixin, RequestLimitsMixin,
+                             ReturnMinimalMixin, UserViewSet):
     """Вьюсет для модели пользователя."""
 
     queryset = User.objects.all()
     pagination_class = WithLimitPagination
+    replica_actions = ('list',)
+    minimal_actions = ('subscribe',)
 
     @action(methods=['put', 'delete'], detail=False, url_path='me/avatar')
     def set_or_delete_avatar(self, request):
@@ -42,8 +87,13 @@ class ApplicationUserViewSet(UserViewSet):
             )
             serializers.is_valid(raise_exception=True)
             serializers.save()
+            touch_recipes(Recipe.objects.filter(author=request.user))
             return Response(serializers.data, status=status.HTTP_200_OK)
-        request.user.avatar.delete(save=True)
+        # Файл может быть общим с другими записями, его удаляет
+        # release_media, когда на него не останется ссылок.
+        request.user.avatar = None
+        request.user.save(update_fields=('avatar',))
+        touch_recipes(Recipe.objects.filter(author=request.user))
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(methods=['get'], detail=False, url_path='subscriptions')
@@ -57,6 +107,7 @@ class ApplicationUserViewSet(UserViewSet):
         return paginator.get_paginated_response(serializer.data)
 
     @action(methods=['post', 'delete'], detail=True, url_path='subscribe')
+    @idempotent
     def subscribe(self, request, id):
         following = get_object_or_404(User, id=id)
         user = request.user
@@ -68,10 +119,13 @@ class ApplicationUserViewSet(UserViewSet):
             )
             serializer.is_valid(raise_exception=True)
             serializer.save()
+            invalidate_membership(user)
+            backfill_timeline(user.id, [following.id])
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         follow = Follow.objects.filter(user=user, following=following)
         result = follow.delete()
+        invalidate_membership(user)
 
         if not result[0]:
             return Response(
@@ -79,22 +133,70 @@ class ApplicationUserViewSet(UserViewSet):
                 data={'errors': 'Такой подписки не существует'}
             )
 
+        prune_timeline(user.id, [following.id])
         return Response(status=status.HTTP_204_NO_CONTENT)
 
+    @action(methods=['post'], detail=False, url_path='subscribe_bulk',
+            permission_classes=(permissions.IsAuthenticated,))
+    def subscribe_bulk(self, request):
+        serializer = BulkChangeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = apply_bulk_changes(
+            request.user, Follow, User, 'following',
+            serializer.validated_data['add'],
+            serializer.validated_data['remove'],
+            forbidden_ids={request.user.id}
+        )
+        invalidate_membership(request.user)
+        backfill_timeline(request.user.id, [
+            result['id'] for result in results
+            if result['status'] == BULK_ADDED
+        ])
+        prune_timeline(request.user.id, [
+            result['id'] for result in results
+            if result['status'] == BULK_REMOVED
+        ])
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
     def get_permissions(self):
         if self.action == 'me':
             return (permissions.IsAuthenticated(),)
         return super().get_permissions()
 
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        touch_recipes(Recipe.objects.filter(author=serializer.instance))
+
+
+def catalog_object_response(get_object, pk):
+    """Объект из снимка каталога или 404."""
+    try:
+        data = get_object(int(pk))
+    except ValueError:
+        data = None
+    if data is None:
+        raise Http404
+    return Response(data)
+
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ReplicaReadMixin, RequestLimitsMixin,
+                 viewsets.ReadOnlyModelViewSet):
     """Вьюсет для модели тегов."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
+    def list(self, request, *args, **kwargs):
+        return Response(get_catalog().tag_list())
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+    def retrieve(self, request, *args, **kwargs):
+        return catalog_object_response(
+            get_catalog().tag, kwargs[self.lookup_field]
+        )
+
+
+class IngredientViewSet(ReplicaReadMixin, RequestLimitsMixin,
+                        viewsets.ReadOnlyModelViewSet):
     """Вьюсет для модели ингредиентов."""
 
     queryset = Ingredient.objects.all()
@@ -102,10 +204,25 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    def list(self, request, *args, **kwargs):
+        return Response(
+            get_catalog().ingredient_list(request.query_params.get('name'))
+        )
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def retrieve(self, request, *args, **kwargs):
+        return catalog_object_response(
+            get_catalog().ingredient, kwargs[self.lookup_field]
+        )
+
+
+class RecipeViewSet(ReplicaReadMixin, RequestLimitsMixin, ReturnMinimalMixin,
+                    viewsets.ModelViewSet):
     """Вьюсет для модели рецептов."""
 
+    minimal_actions = (
+        'create', 'update', 'partial_update', 'favorite', 'shopping_cart'
+    )
+
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
     pagination_class = WithLimitPagination
@@ -117,22 +234,162 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeReadSerializer
         return RecipeWriteSerializer
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        """Список рецептов с общей для всех частью из кэша.
+
+        В кэше лежит страница без флагов пользователя, ключ включает
+        поколение рецептов и параметры запроса. Анонимам она отдается
+        как есть, остальным - с флагами из кэша избранного и подписок.
+        """
+        if 'stream' in request.query_params:
+            params = StreamListSerializer(data=request.query_params)
+            params.is_valid(raise_exception=True)
+            if params.validated_data['stream']:
+                return self.stream_list(
+                    request, params.validated_data['limit']
+                )
+        if not is_list_cacheable(request):
+            return super().list(request, *args, **kwargs)
+        cache_key = get_list_cache_key(request)
+        page = get_cached_list(cache_key)
+        if page is None:
+            page = coalesce(cache_key, lambda: cache_list(
+                cache_key, super(RecipeViewSet, self).list(
+                    request, *args, **kwargs
+                ).data
+            ))
+        etag = get_list_etag(
+            page['version'],
+            page['data']['results'],
+            get_request_membership(request)
+        )
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = (
+                self.compressed_list(request, cache_key, page)
+                or Response(personalize_list(page['data'], request))
+            )
+        return set_validators(response, etag, page['last_modified'])
+
+    def compressed_list(self, request, cache_key, page):
+        """Готовое сжатое тело страницы из кэша для анонимов,
+        которым страница отдается без изменений.
+        """
+        encoding = get_accepted_encoding(request)
+        if (
+            encoding is None
+            or get_request_membership(request) is not None
+            or not isinstance(request.accepted_renderer, JSONRenderer)
+        ):
+            return None
+        body = get_compressed_list(cache_key, page, encoding)
+        if body is None:
+            return None
+        response = HttpResponse(body, content_type='application/json')
+        response['Content-Encoding'] = encoding
+        patch_vary_headers(response, ('Accept-Encoding',))
+        return response
+
+    def get_limits_route(self):
+        """Потоковая выдача списка ограничивается отдельно от страниц."""
+        if self.action == 'list' and is_stream_requested(self.request):
+            return f'{self.basename}.stream'
+        return super().get_limits_route()
+
+    def stream_list(self, request, limit=MAX_STREAM_SIZE):
+        """Первые limit подходящих рецептов (не больше MAX_STREAM_SIZE)
+        без ограничения размера страницы, JSON пишется в ответ
+        по мере сериализации.
+        """
+        queryset = self.filter_queryset(self.get_queryset()).select_related(
+            'author'
+        ).prefetch_related('tags', 'ingredients')
+        return streaming_json_response(
+            queryset,
+            RecipeReadSerializer,
+            self.get_serializer_context(),
+            limit
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        """Рецепт с проверкой If-None-Match до загрузки и сериализации.
+
+        ETag собирается из времени изменения рецепта и флагов
+        пользователя, одновременные запросы считаются один раз.
+        """
+        try:
+            recipe = Recipe.objects.filter(
+                pk=kwargs[self.lookup_field]
+            ).values_list('id', 'author_id', 'updated_at').first()
+        except (TypeError, ValueError):
+            recipe = None
+        if recipe is None:
+            raise Http404
+        recipe_id, author_id, updated_at = recipe
+        etag = get_recipe_etag(
+            recipe_id, author_id, updated_at, get_request_membership(request)
+        )
+        if etag_matches(request, etag):
+            return set_validators(
+                Response(status=status.HTTP_304_NOT_MODIFIED),
+                etag, updated_at
+            )
+
+        data = coalesce(
+            get_detail_cache_key(request, recipe_id),
+            lambda: share_recipe(
+                super(RecipeViewSet, self).retrieve(
+                    request, *args, **kwargs
+                ).data
+            )
+        )
+        return set_validators(
+            Response(personalize_detail(data, request)), etag, updated_at
+        )
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        transaction.on_commit(invalidate_recipe_lists)
+        transaction.on_commit(invalidate_pantry_index)
+
     def add_to_model(self, request, pk, serializer):
         """Добавление рецепта в избранное или покупки."""
         recipe = get_object_or_404(Recipe, pk=pk)
         data = {'user': request.user.id, 'recipe': recipe.id}
         serializer = serializer(data=data, context={'request': request})
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        with transaction.atomic():
+            serializer.save()
+            record_changes(
+                USER_ITEM_ENTITIES[serializer.Meta.model],
+                [recipe.id],
+                request.user.id
+            )
+        invalidate_membership(request.user)
+        bump_trending([recipe.id], serializer.Meta.model)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_from_model(self, request, pk, model):
         """Удаление рецепта из избранного или покупок."""
         recipe = get_object_or_404(Recipe, pk=pk)
         user = request.user
-        result = model.objects.filter(user=user, recipe=recipe).delete()
-
-        if not result[0]:
+        with transaction.atomic():
+            deleted, _ = model.objects.filter(
+                user=user, recipe=recipe
+            ).delete()
+            if deleted:
+                record_changes(
+                    USER_ITEM_ENTITIES[model], [recipe.id], user.id,
+                    deleted=True
+                )
+        invalidate_membership(user)
+
+        if not deleted:
             return Response(
                 data={'errors': 'Такой рецепт не найден.'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -141,17 +398,93 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(detail=True, methods=['post', 'delete'], url_path='favorite')
+    @idempotent
     def favorite(self, request, pk):
         if request.method == 'POST':
             return self.add_to_model(request, pk, FavoriteSerializer)
         return self.delete_from_model(request, pk, Favorite)
 
     @action(detail=True, methods=['post', 'delete'], url_path='shopping_cart')
+    @idempotent
     def shopping_cart(self, request, pk):
         if request.method == 'POST':
             return self.add_to_model(request, pk, ShoppingCartSerializer)
         return self.delete_from_model(request, pk, ShoppingCart)
 
+    def bulk_change_model(self, request, model):
+        """Массовое изменение избранного или покупок."""
+        serializer = BulkChangeSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = apply_bulk_changes(
+            request.user, model, Recipe, 'recipe',
+            serializer.validated_data['add'],
+            serializer.validated_data['remove']
+        )
+        invalidate_membership(request.user)
+        bump_trending([
+            result['id'] for result in results
+            if result['status'] == BULK_ADDED
+        ], model)
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='favorite_bulk',
+            permission_classes=(permissions.IsAuthenticated,))
+    def favorite_bulk(self, request):
+        return self.bulk_change_model(request, Favorite)
+
+    @action(detail=False, methods=['post'], url_path='shopping_cart_bulk',
+            permission_classes=(permissions.IsAuthenticated,))
+    def shopping_cart_bulk(self, request):
+        return self.bulk_change_model(request, ShoppingCart)
+
+    @action(detail=False, methods=['get'], url_path='feed',
+            permission_classes=(permissions.IsAuthenticated,))
+    def feed(self, request):
+        page = self.paginate_queryset(get_feed_queryset(request.user))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], url_path='facets')
+    def facets(self, request):
+        params = urlencode(
+            sorted(request.query_params.lists()), doseq=True
+        )
+        cache_key = f'facets:tags:{request.user.id}:{hash_key(params)}'
+        data = cache.get(cache_key)
+        if data is None:
+            data = TagFacetSerializer(
+                count_tag_facets(request.query_params, request), many=True
+            ).data
+            cache.set(cache_key, data, FACETS_CACHE_TIMEOUT)
+        return Response(data)
+
+    @action(detail=False, methods=['get'], url_path='pantry')
+    def pantry(self, request):
+        params = PantrySearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        recipe_ids = get_pantry_index().search(
+            params.validated_data['ingredients'],
+            params.validated_data['max_missing']
+        )
+        page_ids = self.paginate_queryset(recipe_ids)
+        recipes = Recipe.objects.in_bulk(page_ids)
+        serializer = self.get_serializer(
+            [recipes[i] for i in page_ids if i in recipes], many=True
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'], url_path='similar')
+    def similar(self, request, pk):
+        recipe = get_object_or_404(Recipe, pk=pk)
+        similar_ids = get_similar_recipe_ids(recipe.id)
+        recipes = Recipe.objects.in_bulk(similar_ids)
+        serializer = RecipeShortSerializer(
+            [recipes[i] for i in similar_ids if i in recipes],
+            many=True,
+            context={'request': request}
+        )
+        return Response(serializer.data)
+
     @action(detail=True, methods=['get'], url_path='get-link')
     def get_short_link(self, request, pk):
         recipe = get_object_or_404(Recipe, pk=pk)
@@ -194,3 +527,124 @@ class RecipeViewSet(viewsets.ModelViewSet):
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
 
         return response
+
+
+class MetricsView(APIView):
+    """Метрики текущего процесса для администраторов."""
+
+    permission_classes = (permissions.IsAdminUser,)
+
+    def get(self, request):
+        return Response(metrics.snapshot())
+
+
+class ChangesView(APIView):
+    """Изменения каталога, избранного и покупок после курсора.
+
+    Без курсора возвращается только курсор текущего конца журнала:
+    клиент загружает полные списки и дальше запрашивает изменения.
+    """
+
+    permission_classes = (permissions.AllowAny,)
+    catalog = {
+        Change.RECIPE: ('recipes', Recipe.objects.select_related(
+            'author'
+        ).prefetch_related(
+            'tags', 'ingredients'
+        ), RecipeReadSerializer),
+        Change.TAG: ('tags', Tag.objects.all(), TagSerializer),
+        Change.INGREDIENT: (
+            'ingredients', Ingredient.objects.all(), IngredientSerializer
+        ),
+    }
+    user_items = {
+        Change.FAVORITE: 'favorites',
+        Change.SHOPPING_CART: 'shopping_cart',
+    }
+
+    def get(self, request):
+        params = ChangesQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        if 'since' not in params.validated_data:
+            return Response({
+                'next': make_cursor(get_last_change_id()),
+                'has_more': False,
+                'changes': {},
+            })
+        since_id, unread_since = params.validated_data['since']
+        if is_cursor_expired(unread_since):
+            raise ChangesCursorExpired
+
+        changes, next_id, has_more, unread_since = get_changes(
+            request.user, since_id
+        )
+        data = {}
+        for entity, (name, queryset, serializer) in self.catalog.items():
+            updated_ids = [
+                object_id for object_id, deleted in changes[entity].items()
+                if not deleted
+            ]
+            data[name] = {
+                'updated': serializer(
+                    queryset.filter(id__in=updated_ids),
+                    many=True,
+                    context={'request': request}
+                ).data,
+                'deleted': [
+                    object_id for object_id, deleted in changes[entity].items()
+                    if deleted
+                ],
+            }
+            found_ids = {item['id'] for item in data[name]['updated']}
+            data[name]['deleted'] += [
+                object_id for object_id in updated_ids
+                if object_id not in found_ids
+            ]
+        for entity, name in self.user_items.items():
+            data[name] = {
+                'updated': [
+                    object_id for object_id, deleted in changes[entity].items()
+                    if not deleted
+                ],
+                'deleted': [
+                    object_id for object_id, deleted in changes[entity].items()
+                    if deleted
+                ],
+            }
+        return Response({
+            'next': make_cursor(next_id, unread_since),
+            'has_more': has_more,
+            'changes': data,
+        })
+
+
+class MediaView(APIView):
+    """Файл, на который ссылается рецепт или пользователь.
+
+    С MEDIA_ACCEL_REDIRECT отдачу выполняет nginx по заголовку
+    X-Accel-Redirect из internal-локации, иначе файл отдает Django.
+    """
+
+    permission_classes = (permissions.AllowAny,)
+
+    def get(self, request, name):
+        if not get_referenced([name]):
+            raise Http404
+        if settings.MEDIA_ACCEL_REDIRECT:
+            response = HttpResponse(
+                content_type=mimetypes.guess_type(name)[0]
+            )
+            response['X-Accel-Redirect'] = (
+                settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(name)
+            )
+        else:
+            try:
+                response = FileResponse(default_storage.open(name))
+            except FileNotFoundError:
+                raise Http404
+        response['Cache-Control'] = (
+            MEDIA_IMMUTABLE_CACHE_CONTROL
+            if is_content_name(name) or 'v' in request.GET
+            else MEDIA_CACHE_CONTROL
+        )
+        return response
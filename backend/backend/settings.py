@@ -1,9 +1,13 @@
 import os
+import sys
+import tempfile
 from pathlib import Path
 
 from django.core.management.utils import get_random_secret_key
 from dotenv import load_dotenv
 
+from backend.db_urls import parse_database_url
+
 load_dotenv()
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -43,6 +47,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'api.compression.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -76,6 +81,9 @@ AUTH_USER_MODEL = 'users.ApplicationUser'
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
 
+# Соединения идут через внешний пулер (pgbouncer) в режиме transaction.
+DB_EXTERNAL_POOLER = os.getenv('DB_EXTERNAL_POOLER', 'False') == 'True'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
@@ -83,9 +91,84 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
         'HOST': os.getenv('DB_HOST', ''),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        # Время жизни соединения в секундах: 0 - закрывать после запроса,
+        # None - не ограничивать. При внешнем пулере (pgbouncer)
+        # соединение с ним дешевое, и его можно держать постоянно.
+        'CONN_MAX_AGE': (
+            None if os.getenv('DB_CONN_MAX_AGE') == 'None'
+            else int(os.getenv('DB_CONN_MAX_AGE', 60))
+        ),
+        # Пулер в режиме transaction не поддерживает серверные курсоры.
+        'DISABLE_SERVER_SIDE_CURSORS': DB_EXTERNAL_POOLER,
     }
 }
+# Полный адрес основной базы, например sqlite:////tmp/primary.sqlite3,
+# заменяет параметры выше.
+if os.getenv('DATABASE_URL'):
+    DATABASES['default'].update(
+        parse_database_url(os.getenv('DATABASE_URL'))
+    )
+
+# Проверять ли соединение запросом перед повторным использованием.
+DB_CONN_HEALTH_CHECKS = os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+# Сколько постоянных соединений может держать один воркер, 0 - без лимита.
+DB_MAX_CONNECTIONS_PER_WORKER = int(
+    os.getenv('DB_MAX_CONNECTIONS_PER_WORKER', 0)
+)
+
+# Реплики только для чтения: хосты с параметрами основной базы через
+# запятую в DB_REPLICA_HOSTS или полные адреса через запятую
+# в DB_REPLICA_URLS (например, две локальные базы SQLite).
+REPLICA_CONFIGS = [
+    {'HOST': host}
+    for host in filter(None, os.getenv('DB_REPLICA_HOSTS', '').split(','))
+] + [
+    parse_database_url(url)
+    for url in filter(None, os.getenv('DB_REPLICA_URLS', '').split(','))
+]
+for index, replica_config in enumerate(REPLICA_CONFIGS):
+    DATABASES[f'replica_{index}'] = {
+        **DATABASES['default'],
+        **replica_config,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+# Без настроенных реплик тесты маршрутизации чтений получают псевдоним
+# 'replica_0' - зеркало основной базы; в DATABASE_REPLICAS его
+# добавляют сами тесты.
+if sys.argv[1:2] == ['test'] and 'replica_0' not in DATABASES:
+    DATABASES['replica_0'] = {
+        **DATABASES['default'],
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['api.db_routers.PrimaryReplicaRouter']
+
+# Сколько секунд после записи чтения пользователя идут в основную базу.
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+
+
+# Кэш Django, общий для всех рабочих процессов (memcached), в нем
+# поколения списков, избранного и покупок, счетчики лимитов и блокировки.
+# Без CACHE_LOCATION кэш свой у каждого процесса, и данные, которые
+# должны быть общими, в нем не хранятся.
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', '')
+if CACHE_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': (
+                'django.core.cache.backends.memcached.PyMemcacheCache'
+            ),
+            'LOCATION': CACHE_LOCATION.split(','),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
 
 
 # Password validation
@@ -129,6 +212,14 @@ STATIC_ROOT = '/backend_static/static/'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+DEFAULT_FILE_STORAGE = 'backend.storage.ContentAddressedStorage'
+# Файлы без ссылок моложе этого срока не удаляются: их могла только
+# что получить запись, которая еще не зафиксирована в базе.
+MEDIA_GC_GRACE_SECONDS = 60 * 60
+# Отдача файлов через /api/media/ заголовком X-Accel-Redirect
+# из internal-локации nginx с этим префиксом.
+MEDIA_ACCEL_REDIRECT = os.getenv('MEDIA_ACCEL_REDIRECT', 'False') == 'True'
+MEDIA_ACCEL_REDIRECT_PREFIX = '/protected-media/'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
@@ -143,10 +234,16 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 }
 
+# Время жизни (в секундах) и размер кэша токенов в памяти процесса.
+# Отозванный токен перестает действовать во всех процессах
+# не позже чем через TOKEN_CACHE_TTL секунд. 0 отключает кэш.
+TOKEN_CACHE_TTL = int(os.getenv('TOKEN_CACHE_TTL', 30))
+TOKEN_CACHE_MAX_SIZE = int(os.getenv('TOKEN_CACHE_MAX_SIZE', 10000))
+
 DJOSER = {
     'PERMISSIONS': {
         'user_list': ['rest_framework.permissions.AllowAny'],
@@ -160,6 +257,72 @@ DJOSER = {
     }
 }
 
+# Лимиты для тяжелых маршрутов по ключу '<basename>.<action>':
+# время на запросы к базе в миллисекундах и число одновременных запросов.
+# С внешним пулером statement_timeout не выставляется: SET действует
+# на сессию, а следующий запрос может уйти в другое серверное соединение;
+# срок проверяется только перед каждым запросом.
+# Счетчик одновременных запросов хранится в кэше Django: с общим кэшем
+# (CACHE_LOCATION) лимит общий для всех процессов, без него - свой
+# у каждого процесса, то есть фактически лимит x GUNICORN_WORKERS.
+QUERY_TIMEOUTS = {
+    'recipes.list': 3000,
+    'recipes.stream': 30000,
+    'recipes.download_shopping_cart': 5000,
+    'users.subscriptions': 3000,
+}
+CONCURRENCY_LIMITS = {
+    'recipes.download_shopping_cart': 4,
+    'recipes.stream': 4,
+}
+CONCURRENCY_RETRY_AFTER = 1
+
+# Лента подписок: рецепты авторов, у которых подписчиков больше
+# TIMELINE_FANOUT_MAX_FOLLOWERS, не рассылаются, а читаются при запросе.
+# Рассылка на TIMELINE_FANOUT_SYNC_MAX_FOLLOWERS подписчиков и меньше
+# выполняется в запросе, большие - в фоновом потоке процесса.
+TIMELINE_FANOUT_ASYNC = os.getenv('TIMELINE_FANOUT_ASYNC', 'True') == 'True'
+TIMELINE_FANOUT_SYNC_MAX_FOLLOWERS = int(
+    os.getenv('TIMELINE_FANOUT_SYNC_MAX_FOLLOWERS', 200)
+)
+TIMELINE_FANOUT_MAX_FOLLOWERS = int(
+    os.getenv('TIMELINE_FANOUT_MAX_FOLLOWERS', 5000)
+)
+TIMELINE_PULL_AUTHORS_CACHE_TIMEOUT = 600
+
+# Индекс поиска рецептов по имеющимся ингредиентам: как часто подтягивать
+# изменения рецептов и после скольких изменений перестраивать целиком.
+PANTRY_INDEX_REFRESH_INTERVAL = 60
+PANTRY_INDEX_MAX_OVERLAY = 10000
+
+# Объединение одинаковых одновременных GET-запросов: в процессе между
+# потоками gunicorn (gthread), между процессами - через блокировку
+# в общем кэше (нужен CACHE_LOCATION), ожидание не дольше WAIT секунд.
+REQUEST_COALESCING_SHARED = (
+    os.getenv('REQUEST_COALESCING_SHARED', 'False') == 'True'
+)
+REQUEST_COALESCING_WAIT = 5
+REQUEST_COALESCING_RESULT_TIMEOUT = 5
+
+# Журнал изменений для синхронизации: сколько дней хранятся записи
+# и сколько секунд новые записи не отдаются клиентам, пока
+# не зафиксированы транзакции с меньшими id.
+CHANGES_RETENTION_DAYS = int(os.getenv('CHANGES_RETENTION_DAYS', 30))
+CHANGES_SETTLE_SECONDS = 5
+
+# Сколько секунд хранятся ответы на запросы с Idempotency-Key
+# и через сколько секунд незавершенный запрос считается прерванным.
+IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+IDEMPOTENCY_LOCK_TIMEOUT = 60
+
+# Снимок тегов и ингредиентов, общий для процессов на сервере,
+# и как часто процессы проверяют, не заменен ли он.
+CATALOG_SNAPSHOT_PATH = os.getenv(
+    'CATALOG_SNAPSHOT_PATH',
+    os.path.join(tempfile.gettempdir(), 'foodgram_catalog.bin')
+)
+CATALOG_SNAPSHOT_CHECK_INTERVAL = 5
+
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10 MB
 
 SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
@@ -0,0 +1,60 @@
+import hashlib
+import os
+import re
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+
+CONTENT_NAME = re.compile(r'(^|/)[0-9a-f]{2}/[0-9a-f]{64}\.\w+$')
+
+
+def is_content_name(name):
+    """Имя файла, сохраненного по хэшу: его содержимое не меняется."""
+    return bool(CONTENT_NAME.search(name))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, в котором имя файла - хэш его содержимого.
+
+    Файл сохраняется как ``<каталог>/<2 символа хэша>/<sha256>.<ext>``.
+    Одинаковое содержимое записывается один раз: повторная загрузка
+    возвращает имя уже сохраненного файла и обновляет время его
+    изменения, чтобы сборщик мусора не удалил только что
+    использованный файл.
+    """
+
+    def get_content_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        digest = digest.hexdigest()
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.get_content_name(name, content)
+        try:
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            return self._save(name, content)
+
+    def url(self, name):
+        """Адрес файла, неизменный, пока не изменится содержимое.
+
+        Имена по хэшу уже версионированы, к остальным, сохраненным
+        до этого хранилища, добавляется время изменения файла.
+        """
+        url = super().url(name)
+        if name and not is_content_name(name):
+            try:
+                url += f'?v={os.stat(self.path(name)).st_mtime_ns:x}'
+            except FileNotFoundError:
+                pass
+        return url
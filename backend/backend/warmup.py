@@ -0,0 +1,53 @@
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import close_caches
+from django.db import connections
+from django.urls import get_resolver
+from django.utils import translation
+
+
+def warm_up():
+    """Подготовка процесса к запросам.
+
+    Вызывается в мастере gunicorn с preload_app до создания рабочих
+    процессов, чтобы они получили готовое состояние при fork, а не
+    строили его на первых запросах. Соединения с базой и кэшем в конце
+    закрываются: сокеты нельзя делить между процессами.
+    Возвращает время этапов в секундах.
+    """
+    timings = {}
+
+    started = time.perf_counter()
+    for model in apps.get_models():
+        model._meta.get_fields()
+        model._meta.related_objects
+    timings['models'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    resolver = get_resolver()
+    resolver.reverse_dict
+    resolver.resolve('/api/')
+    timings['urls'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    translation.activate(settings.LANGUAGE_CODE)
+    translation.gettext('This field is required.')
+    translation.deactivate()
+    timings['translations'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    from recipes.catalog import get_catalog
+    get_catalog()
+    timings['catalog'] = time.perf_counter() - started
+
+    connections.close_all()
+    close_caches()
+    return timings
+
+
+def open_connections():
+    """Соединения со всеми базами до первого запроса рабочего процесса."""
+    for connection in connections.all():
+        connection.ensure_connection()
@@ -0,0 +1,44 @@
+import multiprocessing
+import os
+
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(
+    os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1)
+)
+# Потоки в процессе: одинаковые одновременные запросы к процессу
+# объединяются (api.coalescing), ожидание базы не занимает весь процесс.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+# Приложение загружается и прогревается один раз в мастере,
+# рабочие процессы получают его готовым при fork.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+# Открывать соединения с базой сразу после fork, а не на первом запросе.
+preopen_db_connections = (
+    os.getenv('GUNICORN_PREOPEN_DB_CONNECTIONS', 'False') == 'True'
+)
+
+
+def when_ready(server):
+    if preload_app:
+        from django.core.management import call_command
+
+        from backend.warmup import warm_up
+
+        # Ошибки настроек, например общий режим без общего кэша,
+        # останавливают запуск, а не проявляются на запросах.
+        call_command('check')
+        timings = warm_up()
+        server.log.info(
+            'Warm-up finished: %s', ', '.join(
+                f'{stage} {seconds * 1000:.0f}ms'
+                for stage, seconds in timings.items()
+            )
+        )
+
+
+def post_fork(server, worker):
+    if preopen_db_connections:
+        from backend.warmup import open_connections
+        open_connections()
@@ -1,6 +1,7 @@
 from django.contrib import admin
+from django.db.models import Count
 
-from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag
+from recipes.models import Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag
 
 
 class TagAdmin(admin.ModelAdmin):
@@ -11,6 +12,19 @@ class TagAdmin(admin.ModelAdmin):
 class RecipeIngredientInline(admin.TabularInline):
     model = RecipeIngredient
     extra = 1
+    autocomplete_fields = ('ingredient',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('ingredient')
+
+
+class RecipeTagInline(admin.TabularInline):
+    model = RecipeTag
+    extra = 1
+    autocomplete_fields = ('tag',)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('tag')
 
 
 class RecipeAdmin(admin.ModelAdmin):
@@ -18,12 +32,22 @@ class RecipeAdmin(admin.ModelAdmin):
     list_filter = ('tags',)
     search_fields = ('name', 'author__username')
     readonly_fields = ('short_link',)
-    inlines = (RecipeIngredientInline,)
+    autocomplete_fields = ('author',)
+    inlines = (RecipeTagInline, RecipeIngredientInline)
+    # Точное число рецептов при поиске требует отдельного COUNT(*)
+    # по всей таблице, в списке достаточно числа найденных.
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'author'
+        ).annotate(favorite_count=Count('favorite'))
 
     def favorite_count(self, obj):
-        return obj.favorite.count()
+        return obj.favorite_count
 
     favorite_count.short_description = 'Количество добавлений в избранное'
+    favorite_count.admin_order_field = 'favorite_count'
 
 
 class IngredientAdmin(admin.ModelAdmin):
@@ -0,0 +1,276 @@
+import mmap
+import os
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from recipes.models import Ingredient, Tag
+
+
+GENERATION_CACHE_KEY = 'catalog:generation'
+MAGIC = b'RCAT'
+FORMAT_VERSION = 1
+
+HEADER_DTYPE = np.dtype([
+    ('magic', 'S4'),
+    ('format_version', '<u4'),
+    ('generation', '<u8'),
+    ('tags', '<u4'),
+    ('ingredients', '<u4'),
+    ('strings', '<u4'),
+    ('string_bytes', '<u4'),
+])
+TAG_DTYPE = np.dtype([('id', '<i8'), ('name', '<u4'), ('slug', '<u4')])
+INGREDIENT_DTYPE = np.dtype([
+    ('id', '<i8'), ('name', '<u4'), ('measurement_unit', '<u4')
+])
+ALIGNMENT = 8
+
+
+def _align(offset):
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+class StringTable:
+    """Строки снимка без повторов: смещения и байты UTF-8."""
+
+    def __init__(self):
+        self.indexes = {}
+        self.chunks = []
+        self.offsets = [0]
+
+    def add(self, value):
+        if value not in self.indexes:
+            data = value.encode()
+            self.indexes[value] = len(self.chunks)
+            self.chunks.append(data)
+            self.offsets.append(self.offsets[-1] + len(data))
+        return self.indexes[value]
+
+
+def write_catalog_snapshot(path, generation):
+    """Запись снимка тегов и ингредиентов во временный файл
+    и атомарная замена прежнего снимка.
+
+    Файл: заголовок, записи тегов и ингредиентов по возрастанию id,
+    порядок тегов и ингредиентов по названию, смещения строк
+    и таблица строк. Все массивы выровнены по 8 байт.
+    """
+    strings = StringTable()
+    tags = np.array([
+        (tag_id, strings.add(name), strings.add(slug))
+        for tag_id, name, slug in Tag.objects.order_by('id').values_list(
+            'id', 'name', 'slug'
+        )
+    ], dtype=TAG_DTYPE)
+    ingredients = np.array([
+        (ingredient_id, strings.add(name), strings.add(unit))
+        for ingredient_id, name, unit in Ingredient.objects.order_by(
+            'id'
+        ).values_list('id', 'name', 'measurement_unit')
+    ], dtype=INGREDIENT_DTYPE)
+    names = list(strings.indexes)
+    tag_order = np.array(
+        sorted(range(len(tags)), key=lambda i: names[tags[i]['name']]),
+        dtype='<u4'
+    )
+    ingredient_order = np.array(
+        sorted(
+            range(len(ingredients)),
+            key=lambda i: names[ingredients[i]['name']].lower()
+        ),
+        dtype='<u4'
+    )
+    offsets = np.array(strings.offsets, dtype='<u4')
+    string_bytes = b''.join(strings.chunks)
+
+    header = np.array([(
+        MAGIC, FORMAT_VERSION, generation, len(tags), len(ingredients),
+        len(strings.chunks), len(string_bytes)
+    )], dtype=HEADER_DTYPE)
+
+    temporary_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporary_path, 'wb') as snapshot:
+        for part in (header, tags, ingredients, tag_order,
+                     ingredient_order, offsets):
+            snapshot.write(part.tobytes())
+            position = snapshot.tell()
+            snapshot.write(b'\0' * (_align(position) - position))
+        snapshot.write(string_bytes)
+        snapshot.flush()
+        os.fsync(snapshot.fileno())
+    os.replace(temporary_path, path)
+
+
+class CatalogSnapshot:
+    """Теги и ингредиенты из отображенного в память файла снимка.
+
+    Массивы читаются из файла без копирования, поэтому страницы
+    снимка общие для всех процессов на сервере.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as snapshot:
+            self.stat = os.fstat(snapshot.fileno())
+            self.buffer = mmap.mmap(
+                snapshot.fileno(), 0, access=mmap.ACCESS_READ
+            )
+        header = np.frombuffer(self.buffer, HEADER_DTYPE, 1)[0]
+        if (
+            header['magic'] != MAGIC
+            or header['format_version'] != FORMAT_VERSION
+        ):
+            raise ValueError(f'{path} не является снимком каталога.')
+        self.generation = int(header['generation'])
+        self.checked_at = time.monotonic()
+
+        offset = HEADER_DTYPE.itemsize
+        arrays = []
+        for dtype, count in (
+            (TAG_DTYPE, header['tags']),
+            (INGREDIENT_DTYPE, header['ingredients']),
+            (np.dtype('<u4'), header['tags']),
+            (np.dtype('<u4'), header['ingredients']),
+            (np.dtype('<u4'), header['strings'] + 1),
+        ):
+            offset = _align(offset)
+            arrays.append(np.frombuffer(self.buffer, dtype, count, offset))
+            offset += dtype.itemsize * int(count)
+        (self.tags, self.ingredients, self.tag_order,
+         self.ingredient_order, self.offsets) = arrays
+        self.strings_offset = _align(offset)
+
+    def string(self, index):
+        start = self.strings_offset + int(self.offsets[index])
+        end = self.strings_offset + int(self.offsets[index + 1])
+        return self.buffer[start:end].decode()
+
+    def _tag(self, record):
+        return {
+            'id': int(record['id']),
+            'name': self.string(record['name']),
+            'slug': self.string(record['slug']),
+        }
+
+    def _ingredient(self, record):
+        return {
+            'id': int(record['id']),
+            'name': self.string(record['name']),
+            'measurement_unit': self.string(record['measurement_unit']),
+        }
+
+    @staticmethod
+    def _find(records, object_id):
+        position = np.searchsorted(records['id'], object_id)
+        if position < len(records) and records[position]['id'] == object_id:
+            return records[position]
+        return None
+
+    def tag(self, tag_id):
+        record = self._find(self.tags, tag_id)
+        return None if record is None else self._tag(record)
+
+    def ingredient(self, ingredient_id):
+        record = self._find(self.ingredients, ingredient_id)
+        return None if record is None else self._ingredient(record)
+
+    def tag_list(self):
+        """Теги по названию, как в Tag.Meta.ordering."""
+        return [self._tag(self.tags[i]) for i in self.tag_order]
+
+    def ingredient_list(self, name=None):
+        """Ингредиенты по id или, если задано начало названия,
+        найденные двоичным поиском без учета регистра по названию.
+        """
+        if not name:
+            return [self._ingredient(record) for record in self.ingredients]
+        prefix = name.lower()
+
+        def key(position):
+            record = self.ingredients[self.ingredient_order[position]]
+            return self.string(record['name']).lower()
+
+        low, high = 0, len(self.ingredient_order)
+        while low < high:
+            middle = (low + high) // 2
+            if key(middle) < prefix:
+                low = middle + 1
+            else:
+                high = middle
+        found = []
+        while (
+            low < len(self.ingredient_order)
+            and key(low).startswith(prefix)
+        ):
+            found.append(self._ingredient(
+                self.ingredients[self.ingredient_order[low]]
+            ))
+            low += 1
+        return found
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def _is_replaced(snapshot, path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return True
+    return (stat.st_ino, stat.st_mtime_ns) != (
+        snapshot.stat.st_ino, snapshot.stat.st_mtime_ns
+    )
+
+
+def get_catalog():
+    """Снимок каталога процесса.
+
+    Не реже раза в CATALOG_SNAPSHOT_CHECK_INTERVAL секунд проверяется,
+    не заменен ли файл и не отстал ли он от поколения каталога в кэше.
+    Отставший или отсутствующий снимок строится заново, процессы
+    переключаются на новый файл, старый освобождается сборщиком мусора.
+    """
+    global _snapshot
+    snapshot = _snapshot
+    if (
+        snapshot is not None
+        and time.monotonic() - snapshot.checked_at
+        < settings.CATALOG_SNAPSHOT_CHECK_INTERVAL
+    ):
+        return snapshot
+
+    with _snapshot_lock:
+        path = settings.CATALOG_SNAPSHOT_PATH
+        generation = cache.get(GENERATION_CACHE_KEY, 0)
+        if _snapshot is None or _is_replaced(_snapshot, path):
+            try:
+                _snapshot = CatalogSnapshot(path)
+            except (FileNotFoundError, ValueError):
+                write_catalog_snapshot(path, generation)
+                _snapshot = CatalogSnapshot(path)
+        if _snapshot.generation < generation:
+            write_catalog_snapshot(path, generation)
+            _snapshot = CatalogSnapshot(path)
+        _snapshot.checked_at = time.monotonic()
+        return _snapshot
+
+
+def invalidate_catalog():
+    """Новое поколение каталога и снимок с ним после изменения
+    тегов или ингредиентов. Текущий процесс переключается сразу,
+    остальные - при следующей проверке.
+    """
+    global _snapshot
+    cache.add(GENERATION_CACHE_KEY, 0, None)
+    try:
+        generation = cache.incr(GENERATION_CACHE_KEY)
+    except ValueError:
+        generation = 1
+        cache.set(GENERATION_CACHE_KEY, generation, None)
+    with _snapshot_lock:
+        write_catalog_snapshot(settings.CATALOG_SNAPSHOT_PATH, generation)
+        _snapshot = CatalogSnapshot(settings.CATALOG_SNAPSHOT_PATH)
@@ -0,0 +1,156 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Exists, Max, Min, OuterRef, Q
+from django.utils import timezone
+
+from recipes.constants import CHANGES_BATCH_SIZE, CHANGES_COMPACTION_BATCH_SIZE
+from recipes.models import (Change, Favorite, Ingredient, Recipe, ShoppingCart,
+                            Tag)
+
+
+CATALOG_ENTITIES = {
+    Recipe: Change.RECIPE,
+    Tag: Change.TAG,
+    Ingredient: Change.INGREDIENT,
+}
+# Избранное и покупки пишутся в журнал там, где меняются, одной
+# вставкой на запрос: обработчик post_delete заставил бы массовое
+# удаление выбирать строки и писать журнал по одной записи.
+USER_ITEM_ENTITIES = {
+    Favorite: Change.FAVORITE,
+    ShoppingCart: Change.SHOPPING_CART,
+}
+
+
+def record_changes(entity, object_ids, user_id=None, deleted=False):
+    """Запись изменений объектов в журнал.
+
+    Вызывается внутри транзакции изменения, поэтому запись
+    в журнал фиксируется или откатывается вместе с ним.
+    """
+    Change.objects.bulk_create([
+        Change(
+            entity=entity,
+            object_id=object_id,
+            user_id=user_id,
+            deleted=deleted
+        )
+        for object_id in object_ids
+    ])
+
+
+def get_changes(user, since_id, limit=CHANGES_BATCH_SIZE):
+    """Изменения после курсора since_id, не больше limit записей.
+
+    Записи моложе CHANGES_SETTLE_SECONDS не отдаются: транзакции
+    с меньшими id могут быть еще не зафиксированы. Для каждого
+    объекта остается только последнее изменение. Возвращает
+    словарь {тип объекта: {id: удален ли}}, id последней отданной
+    записи, признак того, что изменений больше limit, и время
+    первой неотданной записи (None, если все отданы).
+    """
+    visible = Q(user__isnull=True)
+    if user.is_authenticated:
+        visible |= Q(user=user)
+    entries = list(Change.objects.filter(
+        visible,
+        id__gt=since_id,
+        created__lte=(
+            timezone.now()
+            - timedelta(seconds=settings.CHANGES_SETTLE_SECONDS)
+        )
+    ).values_list(
+        'id', 'entity', 'object_id', 'deleted', 'created'
+    )[:limit + 1])
+
+    has_more = len(entries) > limit
+    unread_since = entries[limit][4] if has_more else None
+    entries = entries[:limit]
+    changes = {entity: {} for entity, _ in Change.ENTITY_CHOICES}
+    for _, entity, object_id, deleted, _ in entries:
+        changes[entity][object_id] = deleted
+    next_id = entries[-1][0] if entries else since_id
+    return changes, next_id, has_more, unread_since
+
+
+def make_cursor(change_id, unread_since=None):
+    """Курсор клиента: id последней записи и время первой
+    непрочитанной.
+
+    Срок курсора отсчитывается от непрочитанной записи, а не от
+    выдачи курсора: иначе клиент, медленно листающий старый журнал,
+    пропустил бы записи, удаленные сжатием. Если все записи прочитаны,
+    следующая будет не старше CHANGES_SETTLE_SECONDS от текущего времени.
+    """
+    if unread_since is None:
+        unread_since = timezone.now() - timedelta(
+            seconds=settings.CHANGES_SETTLE_SECONDS
+        )
+    return f'{change_id}.{int(unread_since.timestamp())}'
+
+
+def parse_cursor(cursor):
+    """Id записи и время первой непрочитанной записи курсора.
+
+    Для чужой строки ValueError, для времени вне допустимого
+    диапазона OverflowError или OSError.
+    """
+    change_id, unread_since = cursor.split('.')
+    return int(change_id), datetime.fromtimestamp(
+        int(unread_since), timezone.utc
+    )
+
+
+def is_cursor_expired(unread_since):
+    """Записи после курсора могли быть удалены при сжатии журнала."""
+    return unread_since < (
+        timezone.now()
+        - timedelta(days=settings.CHANGES_RETENTION_DAYS)
+        + timedelta(seconds=settings.CHANGES_SETTLE_SECONDS)
+    )
+
+
+def get_last_change_id():
+    return Change.objects.aggregate(last_id=Max('id'))['last_id'] or 0
+
+
+def _delete_in_batches(queryset, last_id):
+    first_id = Change.objects.aggregate(first_id=Min('id'))['first_id']
+    if first_id is None:
+        return 0
+    deleted = 0
+    for start in range(first_id - 1, last_id, CHANGES_COMPACTION_BATCH_SIZE):
+        deleted += queryset.filter(
+            id__gt=start, id__lte=start + CHANGES_COMPACTION_BATCH_SIZE
+        ).delete()[0]
+    return deleted
+
+
+def compact_changes():
+    """Сжатие журнала блоками по id.
+
+    Удаляются записи старше CHANGES_RETENTION_DAYS: клиентам
+    с более старым курсором все равно нужна полная синхронизация.
+    Из остальных удаляются записи, после которых у того же объекта
+    есть более новое изменение. Возвращает число удаленных записей.
+    """
+    cutoff = timezone.now() - timedelta(days=settings.CHANGES_RETENTION_DAYS)
+    expired_id = Change.objects.filter(
+        created__lt=cutoff
+    ).aggregate(last_id=Max('id'))['last_id'] or 0
+    deleted = _delete_in_batches(Change.objects.all(), expired_id)
+
+    newer = Change.objects.filter(
+        entity=OuterRef('entity'),
+        object_id=OuterRef('object_id'),
+        id__gt=OuterRef('id')
+    )
+    superseded = Change.objects.alias(
+        has_newer_global=Exists(newer.filter(user__isnull=True)),
+        has_newer_own=Exists(newer.filter(user=OuterRef('user')))
+    ).filter(
+        Q(user__isnull=True, has_newer_global=True)
+        | Q(user__isnull=False, has_newer_own=True)
+    )
+    return deleted + _delete_in_batches(superseded, get_last_change_id())
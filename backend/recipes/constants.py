@@ -3,3 +3,21 @@ MAX_LENGTH_SHORT_URL = 10
 MAX_LENGTH_RECIPE_NAME = 256
 MAX_LENGTH_INGREDIENT_NAME = 128
 MAX_LENGTH_MEASUREMENT_UNIT = 64
+TIMELINE_BATCH_SIZE = 1000
+TIMELINE_BACKFILL_SIZE = 100
+SIMILAR_RECIPES_COUNT = 10
+SIMILARITY_CHUNK_SIZE = 512
+SIMILARITY_LOAD_BATCH_SIZE = 100000
+# Ингредиенты, которые есть в большем числе рецептов (соль, вода),
+# не учитываются при поиске соседей: они делают произведение матриц
+# почти плотным и почти не влияют на сходство.
+SIMILARITY_MAX_INGREDIENT_RECIPES = 5000
+TRENDING_HALF_LIFE_DAYS = 7
+TRENDING_FAVORITE_WEIGHT = 1.0
+TRENDING_SHOPPING_CART_WEIGHT = 0.5
+TRENDING_BATCH_SIZE = 10000
+MAX_LENGTH_CHANGE_ENTITY = 16
+CHANGES_BATCH_SIZE = 500
+CHANGES_COMPACTION_BATCH_SIZE = 10000
+MAX_LENGTH_IDEMPOTENCY_KEY = 255
+LENGTH_REQUEST_FINGERPRINT = 64
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.changes import compact_changes
+
+
+class Command(BaseCommand):
+    """Команда для сжатия журнала изменений."""
+
+    def handle(self, *args, **kwargs):
+        started = time.perf_counter()
+        count = compact_changes()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully removed {count} change log entries '
+            f'in {time.perf_counter() - started:.2f}s'
+        ))
@@ -0,0 +1,109 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+
+from recipes.constants import SIMILARITY_MAX_INGREDIENT_RECIPES
+from recipes.models import Recipe, SimilarRecipes
+from recipes.similarity import (COSINE, METRICS, build_matrix,
+                                get_affected_rows, iter_neighbours,
+                                load_recipe_ingredient_pairs, store_neighbours)
+
+
+BENCHMARK_INGREDIENTS = 2000
+BENCHMARK_INGREDIENTS_PER_RECIPE = 8
+
+
+class Command(BaseCommand):
+    """Команда для расчета похожих рецептов.
+
+    По умолчанию пересчитывает рецепты, измененные после прошлого
+    запуска, и все рецепты, соседи которых от них зависят;
+    с --full - все рецепты.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true')
+        parser.add_argument('--metric', choices=METRICS, default=COSINE)
+        parser.add_argument(
+            '--max-ingredient-recipes',
+            type=int,
+            default=SIMILARITY_MAX_INGREDIENT_RECIPES,
+            help='Ингредиенты из большего числа рецептов не учитываются.'
+        )
+        parser.add_argument(
+            '--benchmark',
+            type=int,
+            metavar='RECIPES',
+            help='Замер на синтетических данных без записи в базу.'
+        )
+
+    def handle(self, *args, **options):
+        if options['benchmark']:
+            return self.benchmark(options['benchmark'], options)
+
+        started_at = timezone.now()
+        pairs = load_recipe_ingredient_pairs()
+        recipe_ids, matrix, lengths = build_matrix(
+            pairs, options['max_ingredient_recipes']
+        )
+        last_run = SimilarRecipes.objects.aggregate(
+            last_run=Max('computed_at')
+        )['last_run']
+
+        if options['full'] or last_run is None:
+            neighbours = iter_neighbours(
+                matrix, lengths, np.arange(len(recipe_ids)),
+                metric=options['metric']
+            )
+        else:
+            changed_ids = np.fromiter(
+                Recipe.objects.filter(
+                    updated_at__gte=last_run
+                ).values_list('id', flat=True),
+                dtype=np.int64
+            )
+            neighbours = iter_neighbours(
+                matrix, lengths,
+                get_affected_rows(recipe_ids, matrix, changed_ids),
+                metric=options['metric']
+            )
+
+        stored = store_neighbours(recipe_ids, neighbours, started_at)
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully computed similar recipes for {stored} recipes'
+        ))
+
+    def benchmark(self, recipes_count, options):
+        rng = np.random.default_rng(0)
+        popularity = 1 / np.arange(1, BENCHMARK_INGREDIENTS + 1)
+        ingredients = rng.choice(
+            BENCHMARK_INGREDIENTS,
+            size=recipes_count * BENCHMARK_INGREDIENTS_PER_RECIPE,
+            p=popularity / popularity.sum()
+        )
+        pairs = np.column_stack((
+            np.repeat(
+                np.arange(recipes_count), BENCHMARK_INGREDIENTS_PER_RECIPE
+            ),
+            ingredients
+        ))
+
+        started = time.perf_counter()
+        recipe_ids, matrix, lengths = build_matrix(
+            pairs, options['max_ingredient_recipes']
+        )
+        built = time.perf_counter()
+        processed = sum(1 for _ in iter_neighbours(
+            matrix, lengths, np.arange(len(recipe_ids)),
+            metric=options['metric']
+        ))
+        finished = time.perf_counter()
+
+        self.stdout.write(
+            f'recipes: {processed}, matrix: {built - started:.2f}s, '
+            f'neighbours: {finished - built:.2f}s '
+            f'({processed / (finished - built):.0f} recipes/s)'
+        )
@@ -2,6 +2,7 @@ import json
 
 from django.core.management.base import BaseCommand
 
+from recipes.catalog import invalidate_catalog
 from recipes.models import Ingredient
 
 
@@ -15,6 +16,7 @@ class Command(BaseCommand):
             data = json.load(file)
             ingredients = [Ingredient(**item) for item in data]
             Ingredient.objects.bulk_create(ingredients)
+        invalidate_catalog()
 
         self.stdout.write(
             self.style.SUCCESS('Successfully loaded ingredients from JSON')
@@ -2,6 +2,7 @@ import json
 
 from django.core.management.base import BaseCommand
 
+from recipes.catalog import invalidate_catalog
 from recipes.models import Tag
 
 
@@ -15,6 +16,7 @@ class Command(BaseCommand):
             data = json.load(file)
             tags = [Tag(**item) for item in data]
             Tag.objects.bulk_create(tags)
+        invalidate_catalog()
 
         self.stdout.write(
             self.style.SUCCESS('Successfully loaded tags from JSON')
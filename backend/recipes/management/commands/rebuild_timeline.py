@@ -0,0 +1,42 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.timeline import backfill_timeline, replay_fan_out
+from users.models import Follow
+
+
+class Command(BaseCommand):
+    """Команда для заполнения лент подписок по существующим подпискам."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--since-hours',
+            type=float,
+            help=(
+                'Только повторить рассылку рецептов за последние часы, '
+                'например после аварийного перезапуска воркеров.'
+            )
+        )
+
+    def handle(self, *args, **options):
+        if options['since_hours'] is not None:
+            count = replay_fan_out(
+                timezone.now() - timedelta(hours=options['since_hours'])
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f'Successfully replayed {count} recipes')
+            )
+            return
+
+        follows = Follow.objects.order_by('user_id').values_list(
+            'user_id', 'following_id'
+        )
+
+        for user_id, following_id in follows.iterator():
+            backfill_timeline(user_id, [following_id])
+
+        self.stdout.write(
+            self.style.SUCCESS('Successfully rebuilt timelines')
+        )
@@ -0,0 +1,17 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.trending import recompute_trending
+
+
+class Command(BaseCommand):
+    """Команда для пересчета популярности рецептов."""
+
+    def handle(self, *args, **kwargs):
+        started = time.perf_counter()
+        count = recompute_trending()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully recomputed trending scores for {count} recipes '
+            f'in {time.perf_counter() - started:.2f}s'
+        ))
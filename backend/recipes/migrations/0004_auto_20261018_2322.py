@@ -0,0 +1,26 @@
+# Generated by Django 3.2 on 2026-10-18 23:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_auto_20261018_2320'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarRecipes',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='similar_recipes', serialize=False, to='recipes.recipe')),
+                ('neighbours', models.BinaryField()),
+                ('computed_at', models.DateTimeField(db_index=True, verbose_name='Дата расчета')),
+            ],
+            options={
+                'verbose_name': 'Похожие рецепты',
+                'verbose_name_plural': 'Похожие рецепты',
+            },
+        ),
+    ]
@@ -1,10 +1,14 @@
 import uuid
 
 from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 from django.db import models
 
-from recipes.constants import (MAX_LENGTH_INGREDIENT_NAME,
+from recipes.constants import (LENGTH_REQUEST_FINGERPRINT,
+                               MAX_LENGTH_CHANGE_ENTITY,
+                               MAX_LENGTH_IDEMPOTENCY_KEY,
+                               MAX_LENGTH_INGREDIENT_NAME,
                                MAX_LENGTH_MEASUREMENT_UNIT,
                                MAX_LENGTH_RECIPE_NAME, MAX_LENGTH_SHORT_URL,
                                MAX_LENGTH_TAG)
@@ -75,11 +79,13 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         upload_to='recipes/',
+        db_index=True,
         verbose_name='Картинка'
     )
     text = models.TextField(verbose_name='Описание')
     tags = models.ManyToManyField(
         Tag,
+        through='RecipeTag',
         verbose_name='Теги',
     )
     cooking_time = models.PositiveIntegerField(
@@ -94,17 +100,32 @@ class Recipe(models.Model):
         auto_now_add=True,
         db_index=True
     )
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True,
+        db_index=True
+    )
     short_link = models.CharField(
         max_length=MAX_LENGTH_SHORT_URL,
         unique=True,
         null=True
     )
+    # Логарифм суммы затухающих во времени добавлений в избранное
+    # и покупки, приведенных к TRENDING_EPOCH. Порядок по этому полю
+    # не меняется со временем, поэтому затухание не нужно пересчитывать.
+    trending_score = models.FloatField('Популярность', default=0)
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         default_related_name = 'recipes'
+        indexes = [
+            models.Index(
+                fields=['-trending_score', '-pub_date'],
+                name='recipe_trending_idx',
+            )
+        ]
 
     def __str__(self):
         return self.name
@@ -115,6 +136,26 @@ class Recipe(models.Model):
         return super().save(*args, **kwargs)
 
 
+class RecipeTag(models.Model):
+    """Модель тегов рецепта."""
+
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'recipes_recipe_tags'
+        unique_together = ('recipe', 'tag')
+        indexes = [
+            models.Index(
+                fields=['tag', 'recipe'],
+                name='recipe_tag_tag_recipe_idx',
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.recipe} - {self.tag}"
+
+
 class RecipeIngredient(models.Model):
     """Модель ингредиентов рецепта."""
 
@@ -148,6 +189,7 @@ class UserItemBase(models.Model):
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    created = models.DateTimeField('Дата добавления', auto_now_add=True)
 
     class Meta:
         abstract = True
@@ -181,3 +223,134 @@ class Favorite(UserItemBase):
                 name='unique_favorite_item',
             )
         ]
+
+
+class TimelineEntry(models.Model):
+    """Запись ленты рецептов авторов, на которых подписан пользователь."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        default_related_name = 'timeline_entries'
+        ordering = ('-pub_date',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_timeline_entry',
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date'],
+                name='timeline_user_pub_date_idx',
+            )
+        ]
+
+
+class SimilarRecipes(models.Model):
+    """Похожие рецепты, рассчитанные по общим ингредиентам.
+
+    Соседи хранятся одним бинарным полем: массив пар
+    (id рецепта, оценка сходства) по убыванию оценки.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='similar_recipes'
+    )
+    neighbours = models.BinaryField()
+    computed_at = models.DateTimeField('Дата расчета', db_index=True)
+
+    class Meta:
+        verbose_name = 'Похожие рецепты'
+        verbose_name_plural = 'Похожие рецепты'
+
+
+class Change(models.Model):
+    """Запись журнала изменений для синхронизации клиентов.
+
+    Журнал только пополняется: id записи служит курсором клиента.
+    Изменения избранного и покупок видны только их владельцу.
+    """
+
+    RECIPE = 'recipe'
+    TAG = 'tag'
+    INGREDIENT = 'ingredient'
+    FAVORITE = 'favorite'
+    SHOPPING_CART = 'shopping_cart'
+    ENTITY_CHOICES = (
+        (RECIPE, 'Рецепт'),
+        (TAG, 'Тег'),
+        (INGREDIENT, 'Ингредиент'),
+        (FAVORITE, 'Избранное'),
+        (SHOPPING_CART, 'Список покупок'),
+    )
+
+    entity = models.CharField(
+        'Тип объекта',
+        max_length=MAX_LENGTH_CHANGE_ENTITY,
+        choices=ENTITY_CHOICES
+    )
+    object_id = models.PositiveBigIntegerField('Id объекта')
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, null=True, blank=True
+    )
+    deleted = models.BooleanField('Удален', default=False)
+    created = models.DateTimeField(
+        'Дата изменения', auto_now_add=True, db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'Изменение'
+        verbose_name_plural = 'Журнал изменений'
+        default_related_name = 'changes'
+        ordering = ('id',)
+        indexes = [
+            models.Index(
+                fields=['entity', 'object_id', 'user'],
+                name='change_object_idx',
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.entity} {self.object_id}'
+
+
+class IdempotencyKey(models.Model):
+    """Результат запроса с заголовком Idempotency-Key.
+
+    Пока запрос выполняется, код ответа пустой. Повтор с тем же
+    ключом получает сохраненный ответ без повторного выполнения.
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    key = models.CharField('Ключ', max_length=MAX_LENGTH_IDEMPOTENCY_KEY)
+    fingerprint = models.CharField(
+        'Хэш запроса', max_length=LENGTH_REQUEST_FINGERPRINT
+    )
+    status_code = models.PositiveSmallIntegerField(
+        'Код ответа', null=True, blank=True
+    )
+    response = models.JSONField(
+        'Тело ответа', null=True, blank=True, encoder=DjangoJSONEncoder
+    )
+    created = models.DateTimeField(
+        'Дата запроса', auto_now_add=True, db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'Ключ идемпотентности'
+        verbose_name_plural = 'Ключи идемпотентности'
+        default_related_name = 'idempotency_keys'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'key'],
+                name='unique_idempotency_key',
+            )
+        ]
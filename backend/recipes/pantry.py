@@ -0,0 +1,179 @@
+import threading
+import time
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from recipes.models import Change, Recipe, RecipeIngredient
+from recipes.similarity import load_recipe_ingredient_pairs
+
+
+GENERATION_CACHE_KEY = 'pantry:generation'
+# Запас на транзакции, закоммиченные позже времени изменения рецепта.
+REFRESH_OVERLAP = timedelta(minutes=1)
+
+
+class PantryIndex:
+    """Инвертированный индекс ингредиент -> рецепты.
+
+    Базовая часть хранится в плоских массивах numpy: id рецептов,
+    отсортированные по ингредиенту и рецепту, и смещения списков
+    для каждого ингредиента. Рецепты, измененные после построения,
+    лежат в небольшом словаре поверх базовой части, удаленные - в нем же
+    с пустым набором ингредиентов. Словарь и массив
+    его id не изменяются, а заменяются одной парой, поэтому поиск
+    в другом потоке видит согласованное состояние без блокировки.
+    """
+
+    def __init__(self, pairs, built_at, generation):
+        order = np.lexsort((pairs[:, 0], pairs[:, 1]))
+        sorted_pairs = pairs[order]
+        self.ingredient_ids, starts = np.unique(
+            sorted_pairs[:, 1], return_index=True
+        )
+        self.offsets = np.append(starts, len(sorted_pairs))
+        self.postings = np.ascontiguousarray(sorted_pairs[:, 0])
+        self.recipe_ids, self.sizes = np.unique(
+            pairs[:, 0], return_counts=True
+        )
+        self.overlay_state = ({}, np.empty(0, dtype=np.int64))
+        self.built_at = built_at
+        self.refreshed_at = built_at
+        self.checked_at = time.monotonic()
+        self.generation = generation
+
+    @classmethod
+    def build(cls):
+        built_at = timezone.now()
+        generation = cache.get(GENERATION_CACHE_KEY, 0)
+        return cls(load_recipe_ingredient_pairs(), built_at, generation)
+
+    def refresh(self, generation):
+        """Перенос в индекс рецептов, измененных и удаленных после
+        прошлого обновления. Удаления берутся из журнала изменений.
+        """
+        refreshed_at = timezone.now()
+        since = self.refreshed_at - REFRESH_OVERLAP
+        changed = {
+            recipe_id: set()
+            for recipe_id in Recipe.objects.filter(
+                updated_at__gte=since
+            ).values_list('id', flat=True)
+        }
+        pairs = RecipeIngredient.objects.filter(
+            recipe_id__in=changed
+        ).values_list('recipe_id', 'ingredient_id')
+        for recipe_id, ingredient_id in pairs:
+            changed[recipe_id].add(ingredient_id)
+        changed.update(
+            (recipe_id, set())
+            for recipe_id in Change.objects.filter(
+                entity=Change.RECIPE, deleted=True, created__gte=since
+            ).values_list('object_id', flat=True)
+        )
+
+        overlay = dict(self.overlay)
+        overlay.update(
+            (recipe_id, frozenset(ingredients))
+            for recipe_id, ingredients in changed.items()
+        )
+        self.overlay_state = (
+            overlay, np.fromiter(overlay, dtype=np.int64, count=len(overlay))
+        )
+        self.refreshed_at = refreshed_at
+        self.checked_at = time.monotonic()
+        self.generation = generation
+
+    @property
+    def overlay(self):
+        return self.overlay_state[0]
+
+    def _postings(self, ingredient_id):
+        position = np.searchsorted(self.ingredient_ids, ingredient_id)
+        if (
+            position == len(self.ingredient_ids)
+            or self.ingredient_ids[position] != ingredient_id
+        ):
+            return self.postings[:0]
+        return self.postings[
+            self.offsets[position]:self.offsets[position + 1]
+        ]
+
+    def search(self, ingredient_ids, max_missing=0):
+        """Id рецептов, для которых не хватает не больше max_missing
+        ингредиентов, по убыванию доли имеющихся ингредиентов.
+        """
+        ingredient_ids = set(ingredient_ids)
+        overlay, overlay_ids = self.overlay_state
+        matched_ids, matched = np.unique(
+            np.concatenate(
+                [self._postings(item) for item in ingredient_ids]
+                + [self.postings[:0]]
+            ),
+            return_counts=True
+        )
+        if len(overlay_ids):
+            keep = ~np.isin(matched_ids, overlay_ids)
+            matched_ids, matched = matched_ids[keep], matched[keep]
+        sizes = self.sizes[np.searchsorted(self.recipe_ids, matched_ids)]
+
+        overlay_matches = [
+            (recipe_id, len(ingredients & ingredient_ids), len(ingredients))
+            for recipe_id, ingredients in overlay.items()
+            if ingredients & ingredient_ids
+        ]
+        if overlay_matches:
+            overlay_matches = np.array(overlay_matches, dtype=np.int64)
+            matched_ids = np.concatenate(
+                (matched_ids, overlay_matches[:, 0])
+            )
+            matched = np.concatenate((matched, overlay_matches[:, 1]))
+            sizes = np.concatenate((sizes, overlay_matches[:, 2]))
+
+        missing = sizes - matched
+        found = missing <= max_missing
+        matched_ids, matched, sizes, missing = (
+            matched_ids[found], matched[found], sizes[found], missing[found]
+        )
+        order = np.lexsort((-matched_ids, missing, -matched / sizes))
+        return matched_ids[order].tolist()
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_pantry_index():
+    """Индекс процесса, обновленный при изменении рецептов.
+
+    Изменения подтягиваются при смене поколения в кэше и не реже
+    раза в PANTRY_INDEX_REFRESH_INTERVAL секунд, индекс целиком
+    перестраивается после PANTRY_INDEX_MAX_OVERLAY измененных рецептов.
+    """
+    global _index
+    with _index_lock:
+        generation = cache.get(GENERATION_CACHE_KEY, 0)
+        if (
+            _index is None
+            or len(_index.overlay) > settings.PANTRY_INDEX_MAX_OVERLAY
+        ):
+            _index = PantryIndex.build()
+        elif (
+            _index.generation != generation
+            or time.monotonic() - _index.checked_at
+            > settings.PANTRY_INDEX_REFRESH_INTERVAL
+        ):
+            _index.refresh(generation)
+        return _index
+
+
+def invalidate_pantry_index():
+    """Сигнал процессам подтянуть изменения рецептов в индекс."""
+    cache.add(GENERATION_CACHE_KEY, 0, None)
+    try:
+        cache.incr(GENERATION_CACHE_KEY)
+    except ValueError:
+        pass
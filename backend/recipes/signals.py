@@ -0,0 +1,27 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from recipes.catalog import invalidate_catalog
+from recipes.changes import CATALOG_ENTITIES, record_changes
+from recipes.models import Ingredient, Tag
+
+
+def record_catalog_save(sender, instance, **kwargs):
+    record_changes(CATALOG_ENTITIES[sender], [instance.pk])
+
+
+def record_catalog_delete(sender, instance, **kwargs):
+    record_changes(CATALOG_ENTITIES[sender], [instance.pk], deleted=True)
+
+
+def rebuild_catalog_snapshot(sender, **kwargs):
+    transaction.on_commit(invalidate_catalog)
+
+
+for model in CATALOG_ENTITIES:
+    post_save.connect(record_catalog_save, sender=model)
+    post_delete.connect(record_catalog_delete, sender=model)
+
+for model in (Tag, Ingredient):
+    post_save.connect(rebuild_catalog_snapshot, sender=model)
+    post_delete.connect(rebuild_catalog_snapshot, sender=model)
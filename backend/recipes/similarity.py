@@ -0,0 +1,175 @@
+from itertools import islice
+
+import numpy as np
+from django.db import transaction
+from scipy import sparse
+
+from recipes.constants import (SIMILAR_RECIPES_COUNT, SIMILARITY_CHUNK_SIZE,
+                               SIMILARITY_LOAD_BATCH_SIZE,
+                               SIMILARITY_MAX_INGREDIENT_RECIPES)
+from recipes.models import RecipeIngredient, SimilarRecipes
+
+
+COSINE = 'cosine'
+JACCARD = 'jaccard'
+METRICS = (COSINE, JACCARD)
+
+NEIGHBOURS_DTYPE = np.dtype([('id', '<i8'), ('score', '<f4')])
+
+
+def pack_neighbours(ids, scores):
+    neighbours = np.empty(len(ids), dtype=NEIGHBOURS_DTYPE)
+    neighbours['id'] = ids
+    neighbours['score'] = scores
+    return neighbours.tobytes()
+
+
+def unpack_neighbour_ids(data):
+    return np.frombuffer(data, dtype=NEIGHBOURS_DTYPE)['id'].tolist()
+
+
+def get_similar_recipe_ids(recipe_id):
+    """Id похожих рецептов по убыванию сходства."""
+    data = SimilarRecipes.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('neighbours', flat=True).first()
+    if data is None:
+        return []
+    return unpack_neighbour_ids(data)
+
+
+def load_recipe_ingredient_pairs():
+    """Пары (рецепт, ингредиент) из базы в виде массива numpy."""
+    pairs = RecipeIngredient.objects.values_list(
+        'recipe_id', 'ingredient_id'
+    ).iterator(chunk_size=SIMILARITY_LOAD_BATCH_SIZE)
+    batches = []
+    while True:
+        batch = list(islice(pairs, SIMILARITY_LOAD_BATCH_SIZE))
+        if not batch:
+            break
+        batches.append(np.array(batch, dtype=np.int64))
+    if not batches:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.concatenate(batches)
+
+
+def build_matrix(pairs,
+                 max_ingredient_recipes=SIMILARITY_MAX_INGREDIENT_RECIPES):
+    """Разреженная бинарная матрица рецепт x ингредиент.
+
+    Возвращает id рецептов по строкам, матрицу без слишком частых
+    ингредиентов и полное число ингредиентов каждого рецепта.
+    """
+    recipe_ids, rows = np.unique(pairs[:, 0], return_inverse=True)
+    ingredient_ids, columns = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.int32), (rows, columns)),
+        shape=(len(recipe_ids), len(ingredient_ids))
+    )
+    matrix.sum_duplicates()
+    lengths = np.diff(matrix.indptr).astype(np.float32)
+
+    frequencies = np.asarray(matrix.sum(axis=0)).ravel()
+    matrix = matrix[
+        :, np.flatnonzero(frequencies <= max_ingredient_recipes)
+    ].tocsr()
+    return recipe_ids, matrix, lengths
+
+
+def find_recipes_with_neighbours(neighbour_ids):
+    """Id рецептов, в сохраненных соседях которых есть neighbour_ids."""
+    neighbour_ids = np.asarray(neighbour_ids, dtype=np.int64)
+    stored = SimilarRecipes.objects.values_list(
+        'recipe_id', 'neighbours'
+    ).iterator(chunk_size=SIMILARITY_LOAD_BATCH_SIZE)
+    return [
+        recipe_id for recipe_id, data in stored
+        if np.isin(
+            np.frombuffer(data, dtype=NEIGHBOURS_DTYPE)['id'], neighbour_ids
+        ).any()
+    ]
+
+
+def get_affected_rows(recipe_ids, matrix, changed_ids,
+                      chunk_size=SIMILARITY_CHUNK_SIZE):
+    """Строки, соседей которых нужно пересчитать после изменения
+    рецептов changed_ids.
+
+    Кроме самих измененных рецептов, это рецепты с общими с ними
+    ингредиентами (измененный рецепт может попасть в их соседи)
+    и рецепты, у которых он уже записан в соседях (он мог перестать
+    подходить или сменить оценку).
+    """
+    changed_rows = np.flatnonzero(np.isin(recipe_ids, changed_ids))
+    transposed = matrix.T.tocsr()
+    parts = [changed_rows]
+    for start in range(0, len(changed_rows), chunk_size):
+        chunk_rows = changed_rows[start:start + chunk_size]
+        parts.append((matrix[chunk_rows] @ transposed).indices)
+    parts.append(np.flatnonzero(np.isin(
+        recipe_ids, find_recipes_with_neighbours(changed_ids)
+    )))
+    return np.unique(np.concatenate(parts).astype(np.int64))
+
+
+def iter_neighbours(matrix, lengths, rows, metric=COSINE,
+                    count=SIMILAR_RECIPES_COUNT,
+                    chunk_size=SIMILARITY_CHUNK_SIZE):
+    """Ближайшие соседи строк матрицы.
+
+    Для блока строк пересечения со всеми рецептами считаются одним
+    произведением разреженных матриц, оценки - векторно по его данным.
+    Возвращает тройки (строка, строки соседей, оценки).
+    """
+    transposed = matrix.T.tocsr()
+    for start in range(0, len(rows), chunk_size):
+        chunk_rows = rows[start:start + chunk_size]
+        product = (matrix[chunk_rows] @ transposed).tocsr()
+        row_sizes = np.diff(product.indptr)
+        owners = np.repeat(chunk_rows, row_sizes)
+        intersections = product.data.astype(np.float32)
+        own_lengths = lengths[owners]
+        other_lengths = lengths[product.indices]
+
+        if metric == JACCARD:
+            scores = intersections / (
+                own_lengths + other_lengths - intersections
+            )
+        else:
+            scores = intersections / np.sqrt(own_lengths * other_lengths)
+        scores[product.indices == owners] = 0
+
+        for position, row in enumerate(chunk_rows):
+            begin, end = product.indptr[position:position + 2]
+            row_scores = scores[begin:end]
+            if len(row_scores) > count:
+                top = np.argpartition(-row_scores, count)[:count]
+            else:
+                top = np.arange(len(row_scores))
+            top = top[np.argsort(-row_scores[top], kind='stable')]
+            top = top[row_scores[top] > 0]
+            yield row, product.indices[begin:end][top], row_scores[top]
+
+
+def store_neighbours(recipe_ids, neighbours, computed_at,
+                     batch_size=SIMILARITY_CHUNK_SIZE):
+    """Сохранение соседей блоками, заменяя прежние записи."""
+    stored = 0
+    while True:
+        batch = [
+            SimilarRecipes(
+                recipe_id=recipe_ids[row],
+                neighbours=pack_neighbours(recipe_ids[columns], scores),
+                computed_at=computed_at
+            )
+            for row, columns, scores in islice(neighbours, batch_size)
+        ]
+        if not batch:
+            return stored
+        with transaction.atomic():
+            SimilarRecipes.objects.filter(
+                recipe_id__in=[item.recipe_id for item in batch]
+            ).delete()
+            SimilarRecipes.objects.bulk_create(batch)
+        stored += len(batch)
@@ -0,0 +1,157 @@
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, Q
+
+from recipes.constants import TIMELINE_BACKFILL_SIZE, TIMELINE_BATCH_SIZE
+from recipes.models import Recipe, TimelineEntry
+from users.models import Follow
+
+
+PULL_AUTHORS_CACHE_KEY = 'timeline:pull_authors'
+
+_executor = ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='timeline-fanout'
+)
+
+
+def get_pull_author_ids():
+    """Авторы, рецепты которых не рассылаются по лентам, а читаются напрямую.
+
+    Это авторы с числом подписчиков больше TIMELINE_FANOUT_MAX_FOLLOWERS.
+    """
+    author_ids = cache.get(PULL_AUTHORS_CACHE_KEY)
+    if author_ids is None:
+        author_ids = frozenset(
+            Follow.objects.values('following').annotate(
+                followers=Count('id')
+            ).filter(
+                followers__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+            ).values_list('following', flat=True)
+        )
+        cache.set(
+            PULL_AUTHORS_CACHE_KEY,
+            author_ids,
+            settings.TIMELINE_PULL_AUTHORS_CACHE_TIMEOUT
+        )
+    return author_ids
+
+
+def _bulk_create_entries(entries):
+    entries = iter(entries)
+    while True:
+        batch = list(islice(entries, TIMELINE_BATCH_SIZE))
+        if not batch:
+            return
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_recipe(recipe_id):
+    """Добавление рецепта в ленты подписчиков автора."""
+    recipe = Recipe.objects.filter(pk=recipe_id).values(
+        'id', 'author_id', 'pub_date'
+    ).first()
+    if recipe is None or recipe['author_id'] in get_pull_author_ids():
+        return
+
+    follower_ids = Follow.objects.filter(
+        following_id=recipe['author_id']
+    ).values_list('user_id', flat=True).iterator(
+        chunk_size=TIMELINE_BATCH_SIZE
+    )
+    _bulk_create_entries(
+        TimelineEntry(
+            user_id=follower_id,
+            recipe_id=recipe['id'],
+            pub_date=recipe['pub_date']
+        )
+        for follower_id in follower_ids
+    )
+
+
+def _fan_out_in_background(recipe_id):
+    try:
+        fan_out_recipe(recipe_id)
+    finally:
+        connections.close_all()
+
+
+def schedule_fan_out(recipe_id):
+    """Запуск рассылки рецепта по лентам после коммита транзакции.
+
+    Не больше TIMELINE_FANOUT_SYNC_MAX_FOLLOWERS подписчиков рецепт
+    получают сразу, в том же запросе. Большие рассылки уходят в фоновый
+    поток и теряются, если процесс завершится аварийно; их повторяет
+    ``rebuild_timeline --since-hours``.
+    """
+    sync_max_followers = settings.TIMELINE_FANOUT_SYNC_MAX_FOLLOWERS
+    if settings.TIMELINE_FANOUT_ASYNC and Follow.objects.filter(
+        following__recipes=recipe_id
+    )[:sync_max_followers + 1].count() > sync_max_followers:
+        _executor.submit(_fan_out_in_background, recipe_id)
+    else:
+        fan_out_recipe(recipe_id)
+
+
+def replay_fan_out(since):
+    """Повторная рассылка рецептов, опубликованных начиная с since.
+
+    Записи лент создаются с ignore_conflicts, поэтому уже разосланные
+    рецепты не дублируются. Возвращает число рецептов.
+    """
+    recipe_ids = Recipe.objects.filter(pub_date__gte=since).order_by(
+        'pub_date'
+    ).values_list('id', flat=True)
+    count = 0
+    for recipe_id in recipe_ids.iterator(chunk_size=TIMELINE_BATCH_SIZE):
+        fan_out_recipe(recipe_id)
+        count += 1
+    return count
+
+
+def backfill_timeline(user_id, author_ids):
+    """Добавление последних рецептов авторов в ленту нового подписчика."""
+    for author_id in set(author_ids) - get_pull_author_ids():
+        recipes = Recipe.objects.filter(author_id=author_id).values(
+            'id', 'pub_date'
+        )[:TIMELINE_BACKFILL_SIZE]
+        _bulk_create_entries(
+            TimelineEntry(
+                user_id=user_id,
+                recipe_id=recipe['id'],
+                pub_date=recipe['pub_date']
+            )
+            for recipe in recipes
+        )
+
+
+def prune_timeline(user_id, author_ids):
+    """Удаление рецептов авторов из ленты после отписки."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, recipe__author_id__in=author_ids
+    ).delete()
+
+
+def get_feed_queryset(user):
+    """Рецепты ленты пользователя в порядке публикации."""
+    pull_author_ids = get_pull_author_ids()
+    followed_pull_authors = list(
+        Follow.objects.filter(
+            user=user, following_id__in=pull_author_ids
+        ).values_list('following_id', flat=True)
+    ) if pull_author_ids else []
+
+    if not followed_pull_authors:
+        return Recipe.objects.filter(
+            timeline_entries__user=user
+        ).order_by('-timeline_entries__pub_date')
+
+    return Recipe.objects.filter(
+        Q(id__in=TimelineEntry.objects.filter(
+            user=user
+        ).values('recipe_id'))
+        | Q(author_id__in=followed_pull_authors)
+    ).order_by('-pub_date')
@@ -0,0 +1,91 @@
+import math
+from datetime import datetime
+from itertools import islice
+
+import numpy as np
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+from recipes.constants import (TRENDING_BATCH_SIZE, TRENDING_FAVORITE_WEIGHT,
+                               TRENDING_HALF_LIFE_DAYS,
+                               TRENDING_SHOPPING_CART_WEIGHT)
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+
+TRENDING_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+DECAY_RATE = math.log(2) / (TRENDING_HALF_LIFE_DAYS * 24 * 60 * 60)
+WEIGHTS = {
+    Favorite: TRENDING_FAVORITE_WEIGHT,
+    ShoppingCart: TRENDING_SHOPPING_CART_WEIGHT,
+}
+
+
+def event_log_weight(weight, moment):
+    """Логарифм веса события, приведенного к TRENDING_EPOCH.
+
+    Вместо уменьшения старых оценок со временем новые события
+    получают экспоненциально больший вес.
+    """
+    return (
+        math.log(weight)
+        + DECAY_RATE * (moment - TRENDING_EPOCH).total_seconds()
+    )
+
+
+def bump_trending(recipe_ids, model):
+    """Учет добавления рецептов в избранное или покупки одним запросом."""
+    if not recipe_ids:
+        return
+    increment = Value(
+        event_log_weight(WEIGHTS[model], timezone.now()),
+        output_field=FloatField()
+    )
+    score = F('trending_score')
+    Recipe.objects.filter(id__in=recipe_ids).update(
+        trending_score=Greatest(score, increment) + Ln(
+            1 + Exp(-Abs(score - increment))
+        )
+    )
+
+
+def recompute_trending():
+    """Пересчет оценок популярности по всем добавлениям."""
+    recipe_ids = np.fromiter(
+        Recipe.objects.order_by('id').values_list('id', flat=True),
+        dtype=np.int64
+    )
+    scores = np.zeros(len(recipe_ids))
+
+    for model, weight in WEIGHTS.items():
+        events = model.objects.values_list('recipe_id', 'created').iterator(
+            chunk_size=TRENDING_BATCH_SIZE
+        )
+        while True:
+            batch = list(islice(events, TRENDING_BATCH_SIZE))
+            if not batch:
+                break
+            ids, moments = zip(*batch)
+            ids = np.array(ids, dtype=np.int64)
+            positions = np.minimum(
+                np.searchsorted(recipe_ids, ids), len(recipe_ids) - 1
+            )
+            known = recipe_ids[positions] == ids
+            increments = np.log(weight) + DECAY_RATE * np.array([
+                (moment - TRENDING_EPOCH).total_seconds()
+                for moment in moments
+            ])
+            np.logaddexp.at(scores, positions[known], increments[known])
+
+    for start in range(0, len(recipe_ids), TRENDING_BATCH_SIZE):
+        Recipe.objects.bulk_update(
+            [
+                Recipe(id=recipe_id, trending_score=score)
+                for recipe_id, score in zip(
+                    recipe_ids[start:start + TRENDING_BATCH_SIZE].tolist(),
+                    scores[start:start + TRENDING_BATCH_SIZE].tolist()
+                )
+            ],
+            ['trending_score']
+        )
+    return len(recipe_ids)
@@ -16,8 +16,9 @@ class ApplicationUserAdmin(UserAdmin):
 class FollowAdmin(admin.ModelAdmin):
     model = Follow
     list_display = ('user', 'following')
-    list_filter = ('user', 'following')
-    search_fields = ('user', 'following')
+    list_select_related = ('user', 'following')
+    search_fields = ('user__username', 'following__username')
+    autocomplete_fields = ('user', 'following')
 
 
 admin.site.register(User, ApplicationUserAdmin)
@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-19 00:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0002_auto_20240922_1942'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='applicationuser',
+            name='avatar',
+            field=models.ImageField(blank=True, db_index=True, null=True, upload_to='users/', verbose_name='Аватар'),
+        ),
+    ]
@@ -44,6 +44,7 @@ class ApplicationUser(AbstractUser):
         upload_to='users/',
         blank=True,
         null=True,
+        db_index=True,
         verbose_name='Аватар'
     )
 